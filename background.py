@@ -0,0 +1,33 @@
+from PySide6.QtCore import *
+import threading
+
+class BackgroundTask(QObject):
+    """Run a function on a worker thread and deliver its result on the GUI thread"""
+    finished = Signal(object, object)  # result, exception (None on success)
+
+    def __init__(self, func, *args, **kwargs):
+        super().__init__()
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.cancelled = False
+
+    def start(self):
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def cancel(self):
+        """Ask the task to stop; the function can poll is_cancelled"""
+        self.cancelled = True
+
+    def is_cancelled(self):
+        return self.cancelled
+
+    def run(self):
+        try:
+            result = self.func(*self.args, **self.kwargs)
+            error = None
+        except Exception as e:
+            result = None
+            error = e
+        # Signals emitted from the worker thread are queued to the GUI thread
+        self.finished.emit(result, error)
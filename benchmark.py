@@ -0,0 +1,339 @@
+"""Canvas performance benchmarks.
+
+Run with: python benchmark.py
+Set QT_QPA_PLATFORM=offscreen to run without a display.
+"""
+import sys
+import time
+from PySide6.QtWidgets import QApplication, QStyleOptionGraphicsItem, QTextBrowser
+from PySide6.QtGui import QImage, QPainter
+from PySide6.QtCore import Qt
+from node_canvas import NodeCanvas
+from text_node import TextNode
+from markdown_stream import StreamingMarkdownRenderer, MARKDOWN_EXTENSIONS
+
+
+def build_canvas(edge_count):
+    """Create a canvas holding a single chain with the given number of edges"""
+    canvas = NodeCanvas()
+    nodes = []
+    for i in range(edge_count + 1):
+        node = canvas.add_node(f"Node {i}", f"Text {i}")
+        node.setPos((i % 100) * 300, (i // 100) * 350)
+        nodes.append(node)
+    for start_node, end_node in zip(nodes, nodes[1:]):
+        canvas.create_connection(start_node, end_node)
+    return canvas, nodes
+
+
+def bench_node_drag(edge_counts=(500, 1000, 5000), moves=200):
+    """Time moving one node, which should only re-route its own connections"""
+    print("Node drag (per move event)")
+    for edge_count in edge_counts:
+        canvas, nodes = build_canvas(edge_count)
+        node = nodes[len(nodes) // 2]
+        origin = node.pos()
+        start = time.perf_counter()
+        for i in range(moves):
+            node.setPos(origin.x() + i, origin.y() + i)
+        elapsed = (time.perf_counter() - start) / moves
+        print(f"  {edge_count:>6} edges: {elapsed * 1e6:8.1f} us/event")
+        canvas.clear_all_nodes()
+
+
+def bench_drag_repaint(modes=('full', 'smart'), edge_count=2000, moves=100):
+    """Time a node move including the viewport repaint it triggers"""
+    print("Node drag with repaint (per frame)")
+    app = QApplication.instance()
+    for mode in modes:
+        canvas, nodes = build_canvas(edge_count)
+        canvas.set_viewport_update_mode(mode)
+        canvas.resize(1600, 1000)
+        canvas.show()
+        canvas.zoom_view(0.2)
+        canvas.centerOn(nodes[0].pos())
+        node = nodes[1]
+        origin = node.pos()
+        app.processEvents()
+        start = time.perf_counter()
+        for i in range(moves):
+            node.setPos(origin.x() + i, origin.y())
+            app.processEvents()
+        elapsed = (time.perf_counter() - start) / moves
+        print(f"  {mode:>8}: {elapsed * 1e3:8.2f} ms/frame ({edge_count} edges)")
+        canvas.hide()
+        canvas.clear_all_nodes()
+
+
+
+def bench_text_paint(text_length=50000, paints=200):
+    """Time repainting a node holding a long note"""
+    print("Long-text node paint (per paint)")
+    node = TextNode("Long", ("lorem ipsum dolor sit amet " * (text_length // 27 + 1))[:text_length])
+    image = QImage(400, 400, QImage.Format_ARGB32_Premultiplied)
+    painter = QPainter(image)
+    option = QStyleOptionGraphicsItem()
+
+    start = time.perf_counter()
+    for _ in range(paints):
+        painter.drawText(node.get_content_rect(), Qt.AlignLeft | Qt.TextWordWrap, node.text)
+    uncached = (time.perf_counter() - start) / paints
+
+    start = time.perf_counter()
+    for _ in range(paints):
+        node.paint(painter, option, None)
+    cached = (time.perf_counter() - start) / paints
+    painter.end()
+    print(f"  drawText: {uncached * 1e3:8.2f} ms  cached layout: {cached * 1e3:8.2f} ms"
+          f"  ({text_length} chars)")
+
+
+
+def bench_overview_paint(edge_count=2000, frames=20):
+    """Time full repaints of a zoomed-out canvas with and without level of detail"""
+    print("Zoomed-out full repaint (per frame)")
+    app = QApplication.instance()
+    canvas, nodes = build_canvas(edge_count)
+    canvas.resize(1600, 1000)
+    canvas.show()
+    canvas.zoom_view(0.12)
+    canvas.centerOn(nodes[len(nodes) // 2].pos())
+    for label, thresholds in (("full detail", (0, 0, 0)), ("level of detail", (0.4, 0.15, 0.4))):
+        canvas.set_level_of_detail(*thresholds)
+        app.processEvents()
+        start = time.perf_counter()
+        for _ in range(frames):
+            canvas.viewport().repaint()
+        elapsed = (time.perf_counter() - start) / frames
+        print(f"  {label:>15}: {elapsed * 1e3:8.2f} ms/frame ({edge_count} edges)")
+    canvas.set_level_of_detail()
+    canvas.hide()
+    canvas.clear_all_nodes()
+
+
+def bench_markdown_stream(paragraphs=200, tokens_per_frame=20):
+    """Time rendering a streamed answer: full re-render per frame vs incremental blocks"""
+    import markdown
+    print("Markdown streaming (whole response)")
+    answer = "".join(f"## Section {i}\n\nSome **bold** text and a list:\n\n- one\n- two\n\n"
+                     for i in range(paragraphs))
+    tokens = [answer[i:i + 4] for i in range(0, len(answer), 4)]
+    frames = [tokens[i:i + tokens_per_frame] for i in range(0, len(tokens), tokens_per_frame)]
+
+    display = QTextBrowser()
+    start = time.perf_counter()
+    text = ""
+    for frame in frames:
+        text += "".join(frame)
+        display.setHtml(markdown.markdown(text, extensions=MARKDOWN_EXTENSIONS))
+    print(f"  {'full re-render':>15}: {time.perf_counter() - start:8.2f} s ({len(frames)} frames)")
+
+    display = QTextBrowser()
+    renderer = StreamingMarkdownRenderer(display, 0)
+    start = time.perf_counter()
+    for frame in frames:
+        for token in frame:
+            renderer.append(token)
+        renderer.render()
+    renderer.finish()
+    print(f"  {'incremental':>15}: {time.perf_counter() - start:8.2f} s ({len(frames)} frames)")
+
+
+def bench_chat_transcript(exchanges=1000, sample=50):
+    """Time adding questions and answers to a long chat: every message rendered vs a bounded window"""
+    import io
+    from chat_transcript import ChatTranscript, ChatMessage
+    print(f"Chat transcript (per exchange after {exchanges} exchanges)")
+    answer = "".join(f"Paragraph {i} with **bold** text.\n\n- one\n- two\n\n" for i in range(10))
+    for label, window_size in (('unbounded', 10 ** 9), ('windowed', None)):
+        display = QTextBrowser()
+        display.resize(600, 400)
+        display.show()
+        transcript = ChatTranscript(display) if window_size is None else ChatTranscript(display, window_size=window_size)
+
+        def exchange(i):
+            transcript.add(ChatMessage('user', f"Question {i}"))
+            message = transcript.start_response(ChatMessage('assistant', model="bench"))
+            transcript.append(message, answer)
+            transcript.finish_response(message)
+            QApplication.processEvents()  # Layout and paint as on screen
+        for i in range(exchanges):
+            exchange(i)
+        start = time.perf_counter()
+        for i in range(sample):
+            exchange(i)
+        elapsed = (time.perf_counter() - start) / sample
+
+        # Resizing the chat panel lays out the whole document again
+        start = time.perf_counter()
+        display.resize(500, 400)
+        QApplication.processEvents()
+        relayout = time.perf_counter() - start
+        print(f"  {label:>15}: {elapsed * 1e3:8.2f} ms/exchange, resize {relayout * 1e3:8.2f} ms "
+              f"({display.document().blockCount()} blocks shown)")
+
+    start = time.perf_counter()
+    transcript.write(io.StringIO(), is_markdown=True)
+    print(f"  {'markdown export':>15}: {(time.perf_counter() - start) * 1e3:8.2f} ms ({len(transcript)} messages)")
+
+
+def bench_text_viewer(lines=(13000, 100000), keys=50):
+    """Time showing a large note in the text viewer, the longest stall while it loads, and typing into it"""
+    from PySide6.QtTest import QTest
+    from text_viewer import TextViewer
+    print("Text viewer (large note)")
+    viewer = TextViewer()
+    viewer.resize(400, 600)
+    viewer.show()
+    for count in lines:
+        text = "".join(f"Line {i} of an imported note, with enough words to wrap in the viewer.\n"
+                       for i in range(count))
+        node = TextNode("Imported Text", text)
+        start = time.perf_counter()
+        viewer.display_node(node)
+        QApplication.processEvents()
+        first = time.perf_counter() - start
+        longest = 0
+        while viewer.loading:
+            step = time.perf_counter()
+            QApplication.processEvents()
+            longest = max(longest, time.perf_counter() - step)
+        loaded = time.perf_counter() - start
+
+        viewer.text_edit.setFocus()
+        start = time.perf_counter()
+        for i in range(keys):
+            QTest.keyClick(viewer.text_edit, Qt.Key_A)
+            QApplication.processEvents()
+        typing = (time.perf_counter() - start) / keys
+        viewer.flush()
+        print(f"  {len(text) / 1e6:6.1f} MB: shown after {first * 1e3:7.1f} ms, loaded after {loaded * 1e3:7.1f} ms "
+              f"(longest stall {longest * 1e3:6.1f} ms), {typing * 1e3:6.2f} ms/key")
+
+
+def bench_duplicates(node_count=10000, words_per_node=40):
+    """Time near-duplicate detection: indexing every node, then after editing one"""
+    import random
+    print("Near-duplicate detection")
+    rng = random.Random(0)
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    vocabulary = ["".join(rng.choice(letters) for _ in range(rng.randint(3, 9))) for _ in range(3000)]
+    canvas = NodeCanvas()
+    for i in range(node_count):
+        canvas.add_node(f"Node {i}", " ".join(rng.choice(vocabulary) for _ in range(words_per_node)))
+    start = time.perf_counter()
+    canvas.find_duplicates()
+    print(f"  {'first scan':>15}: {(time.perf_counter() - start) * 1e3:8.2f} ms ({node_count} nodes)")
+    node = next(iter(canvas.nodes.values()))
+    node.text += " edited"
+    canvas.node_changed(node, 'text')
+    start = time.perf_counter()
+    canvas.find_duplicates()
+    print(f"  {'after an edit':>15}: {(time.perf_counter() - start) * 1e3:8.2f} ms")
+    canvas.clear_all_nodes()
+
+
+def bench_stream_parser(tokens=200000, chunk_size=1024):
+    """Parse streamed answers from bytes: line-by-line json.loads as before vs the incremental parsers"""
+    import io
+    import json
+    import requests
+    from stream_parser import NDJSONParser, SSEParser
+    print(f"Stream parsing ({tokens} tokens, {chunk_size} byte chunks)")
+    ndjson = b"".join(json.dumps({'message': {'role': 'assistant', 'content': f"word{i} "}, 'done': False})
+                      .encode() + b"\n" for i in range(tokens))
+    sse = b"".join(b"data: " + json.dumps({'choices': [{'delta': {'content': f"word{i} "}}]}).encode() + b"\n\n"
+                   for i in range(tokens))
+    chunks = lambda data: [data[i:i + chunk_size] for i in range(0, len(data), chunk_size)]
+
+    response = requests.Response()
+    response.raw = io.BytesIO(ndjson)
+    start = time.perf_counter()
+    for line in response.iter_lines():
+        if line:
+            json.loads(line)
+    print(f"  {'iter_lines':>15}: {tokens / (time.perf_counter() - start):12,.0f} tokens/s")
+
+    for label, data, parser in (('NDJSON', ndjson, NDJSONParser()), ('SSE', sse, SSEParser())):
+        data_chunks = chunks(data)
+        start = time.perf_counter()
+        for chunk in data_chunks:
+            parser.feed(chunk)
+        parser.close()
+        print(f"  {label:>15}: {tokens / (time.perf_counter() - start):12,.0f} tokens/s")
+
+
+def bench_chat_stream(servers=("Ollama", "LM Studio"), tokens=2000, rate=0):
+    """Stream a long answer from the mock server into the chat panel.
+
+    Reports time to the first rendered text, rendered tokens per second and
+    the longest gaps between event loop passes (GUI stalls).
+    """
+    from PySide6.QtCore import QTimer, QElapsedTimer
+    from chat_panel import ChatPanel
+    import mock_server
+    print(f"Chat streaming ({tokens} tokens, {'unlimited' if not rate else rate} tokens/s)")
+    server = mock_server.start_server(settings=mock_server.MockSettings(tokens=tokens, rate=rate, latency=0))
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    app = QApplication.instance()
+
+    canvas = NodeCanvas()
+    canvas.add_node("Node", "Some text to analyse")
+    panel = ChatPanel(canvas)
+    panel.cache_checkbox.setChecked(False)
+    panel.map_reduce_checkbox.setChecked(False)
+    panel.retrieval_checkbox.setChecked(False)
+    for server_name in servers:
+        panel.server_endpoints[server_name] = base_url
+        panel.server_selector.setCurrentText(server_name)
+        panel.refresh_models()
+        while panel.server_monitor.tasks:
+            app.processEvents()
+
+        # Event loop stalls, sampled by a zero-interval timer
+        clock = QElapsedTimer()
+        gaps = []
+        last = [0]
+
+        def tick():
+            now = clock.elapsed()
+            gaps.append(now - last[0])
+            last[0] = now
+        ticker = QTimer()
+        ticker.timeout.connect(tick)
+
+        document = panel.chat_display.document()
+        first_render = []
+        panel.input_field.setText("Summarise this")
+        clock.start()
+        ticker.start(0)
+        panel.send_message()
+        start_length = document.characterCount()
+        document.contentsChanged.connect(
+            lambda: first_render or document.characterCount() <= start_length
+            or first_render.append(clock.elapsed()))
+        while panel.request_queue:
+            app.processEvents()
+        elapsed = clock.elapsed() / 1000
+        ticker.stop()
+        document.contentsChanged.disconnect()
+
+        gaps.sort()
+        p99 = gaps[int(len(gaps) * 0.99)] if gaps else 0
+        print(f"  {server_name:>15}: first render {first_render[0] if first_render else float('nan'):.0f} ms, "
+              f"{tokens / elapsed:8.0f} tokens/s, stalls p99 {p99} ms, max {gaps[-1] if gaps else 0} ms")
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    app = QApplication.instance() or QApplication(sys.argv)
+    bench_node_drag()
+    bench_drag_repaint()
+    bench_text_paint()
+    bench_overview_paint()
+    bench_markdown_stream()
+    bench_chat_transcript()
+    bench_text_viewer()
+    bench_duplicates()
+    bench_stream_parser()
+    bench_chat_stream()
@@ -1,13 +1,29 @@
 from PySide6.QtWidgets import *
 from PySide6.QtCore import *
-from PySide6.QtGui import QTextCursor
 import requests
-import json
 import subprocess
 import threading
 import platform
-import markdown
 import re
+import time
+import os
+import json
+from llm_client import StreamRequest, get_context_length, conversation_start, embed, SAMPLING_PARAMETERS
+from background import BackgroundTask
+from response_cache import ResponseCache, make_key
+from context_budget import (estimate_tokens, fit_paths, format_paths, shorten,
+                            DEFAULT_CONTEXT_LENGTH, RESPONSE_RESERVE)
+from map_reduce import MapRequest, MAP_PROMPT, REDUCE_PROMPT, DEFAULT_CONCURRENCY
+from embedding_index import EmbeddingIndex, index_path, read_index, numpy
+from chat_transcript import ChatTranscript, ChatMessage
+from request_queue import ChatJob, RequestQueue, DEFAULT_SERVER_CONCURRENCY
+from server_monitor import ServerMonitor
+
+DEFAULT_EMBEDDING_MODEL = "nomic-embed-text"
+DEFAULT_TOP_K = 8
+
+# Near-duplicate groups and overlaps listed in the chat
+MAX_LISTED_DUPLICATES = 20
 
 class ChatPanel(QWidget):
     def __init__(self, canvas):
@@ -34,15 +50,20 @@ class ChatPanel(QWidget):
         controls_layout.addWidget(QLabel("Server:"))
         self.server_selector = QComboBox()
         self.server_selector.addItems(["Ollama", "LM Studio"])
-        self.server_selector.currentTextChanged.connect(self.fetch_models)
+        self.server_selector.currentTextChanged.connect(lambda _: self.fetch_models())
         controls_layout.addWidget(self.server_selector)
+        # Up/down state and response time of the selected server
+        self.server_status_label = QLabel()
+        controls_layout.addWidget(self.server_status_label)
         
         # Model controls
         controls_layout.addWidget(QLabel("Model:"))
         self.model_selector = QComboBox()
+        self.model_selector.currentTextChanged.connect(self.fetch_context_length)
+        self.model_selector.currentTextChanged.connect(lambda model: self.show_server_status())
         controls_layout.addWidget(self.model_selector)
         self.refresh_button = QPushButton("Refresh Models")
-        self.refresh_button.clicked.connect(self.fetch_models)
+        self.refresh_button.clicked.connect(self.refresh_models)
         controls_layout.addWidget(self.refresh_button)
         
         # Add color selection controls
@@ -59,6 +80,17 @@ class ChatPanel(QWidget):
         self.bg_color_button.clicked.connect(self.change_canvas_background)
         controls_layout.addWidget(self.bg_color_button)
 
+        # Find near-duplicate nodes, then select or colour-label them
+        self.duplicates_button = QPushButton("Duplicates")
+        duplicates_menu = QMenu(self.duplicates_button)
+        duplicates_menu.addAction("Select Near-Duplicates", self.select_duplicates)
+        duplicates_menu.addAction("Label Near-Duplicates with Colour", self.label_duplicates)
+        self.duplicates_button.setMenu(duplicates_menu)
+        if self.canvas.duplicate_index is None:
+            self.duplicates_button.setEnabled(False)
+            self.duplicates_button.setToolTip("Install numpy to find near-duplicate nodes")
+        controls_layout.addWidget(self.duplicates_button)
+
         # Add Clear Canvas button
         self.clear_canvas_button = QPushButton("Clear Canvas")
         self.clear_canvas_button.clicked.connect(self.clear_canvas)
@@ -81,8 +113,27 @@ class ChatPanel(QWidget):
         self.chat_display.setFrameStyle(QFrame.NoFrame)
         self.chat_display.setOpenExternalLinks(True)  # Now this works
         chat_layout.addWidget(self.chat_display)
+        # Messages of the chat; only the latest are rendered in the display
+        self.transcript = ChatTranscript(self.chat_display, clean=self.clean_orphaned_bullet_points)
         
         layout.addWidget(chat_frame)
+
+        # Questions being answered or waiting their turn
+        self.queue_frame = QFrame()
+        queue_layout = QHBoxLayout(self.queue_frame)
+        queue_layout.setContentsMargins(5, 0, 5, 0)
+        self.queue_list = QListWidget()
+        self.queue_list.setMaximumHeight(80)
+        queue_layout.addWidget(self.queue_list)
+        queue_buttons = QVBoxLayout()
+        for label, slot in (("Up", lambda: self.move_queued(-1)), ("Down", lambda: self.move_queued(1)),
+                            ("Cancel", self.cancel_queued)):
+            button = QPushButton(label)
+            button.clicked.connect(slot)
+            queue_buttons.addWidget(button)
+        queue_layout.addLayout(queue_buttons)
+        self.queue_frame.setVisible(False)
+        layout.addWidget(self.queue_frame)
         
         # Input area with spacing
         input_frame = QFrame()
@@ -91,13 +142,101 @@ class ChatPanel(QWidget):
         
         self.input_field = QLineEdit()
         self.send_button = QPushButton("Send")
+        self.send_button.setToolTip("Hold Shift to ask the model again instead of using a cached answer")
         self.send_button.clicked.connect(self.send_message)
         
         # Connect the returnPressed signal to send_message
         self.input_field.returnPressed.connect(self.send_message)
+
+        # Stop button aborts the responses being streamed and the queued questions
+        self.stop_button = QPushButton("Stop")
+        self.stop_button.setEnabled(False)
+        self.stop_button.clicked.connect(self.stop_message)
         
+        # Opt-in cache of answers to repeated questions
+        self.settings = QSettings('Dou', 'Dou')
+        self.cache_checkbox = QCheckBox("Cache")
+        self.cache_checkbox.setToolTip("Reuse answers to questions already asked about unchanged text")
+        self.cache_checkbox.setChecked(self.settings.value('response_cache_enabled', False, type=bool))
+        self.cache_checkbox.toggled.connect(
+            lambda checked: self.settings.setValue('response_cache_enabled', checked))
+
         input_layout.addWidget(self.input_field)
         input_layout.addWidget(self.send_button)
+        input_layout.addWidget(self.stop_button)
+
+        # Request options go on their own row below the input
+        options_layout = QHBoxLayout()
+        options_layout.setContentsMargins(5, 0, 5, 0)
+        options_layout.addWidget(self.cache_checkbox)
+
+        # Questions the selected server answers at once; more are queued
+        self.server_concurrency_spinbox = QSpinBox()
+        self.server_concurrency_spinbox.setRange(1, 8)
+        self.server_concurrency_spinbox.setToolTip(
+            "Questions the selected server answers at once; further questions wait in the queue")
+        options_layout.addWidget(QLabel("Parallel:"))
+        options_layout.addWidget(self.server_concurrency_spinbox)
+
+        # Context window the prompt is fitted into; Auto asks the server
+        self.context_spinbox = QSpinBox()
+        self.context_spinbox.setRange(0, 1048576)
+        self.context_spinbox.setSingleStep(1024)
+        self.context_spinbox.setSpecialValueText("Auto")
+        self.context_spinbox.setSuffix(" tokens")
+        self.context_spinbox.setToolTip("Context length of the model; Auto uses the length reported by the server")
+        self.context_spinbox.setValue(self.settings.value('context_length', 0, type=int))
+        self.context_spinbox.valueChanged.connect(
+            lambda value: self.settings.setValue('context_length', value))
+        options_layout.addWidget(QLabel("Context:"))
+        options_layout.addWidget(self.context_spinbox)
+
+        # Map-reduce asks about each path separately, then combines the answers
+        self.map_reduce_checkbox = QCheckBox("Per path")
+        self.map_reduce_checkbox.setToolTip(
+            "With All Paths, ask about each path in its own request and combine the answers")
+        self.map_reduce_checkbox.setChecked(self.settings.value('map_reduce_enabled', False, type=bool))
+        self.map_reduce_checkbox.toggled.connect(
+            lambda checked: self.settings.setValue('map_reduce_enabled', checked))
+        self.concurrency_spinbox = QSpinBox()
+        self.concurrency_spinbox.setRange(1, 16)
+        self.concurrency_spinbox.setPrefix("x")
+        self.concurrency_spinbox.setToolTip("Number of path requests sent at once")
+        self.concurrency_spinbox.setValue(
+            self.settings.value('map_reduce_concurrency', DEFAULT_CONCURRENCY, type=int))
+        self.concurrency_spinbox.valueChanged.connect(
+            lambda value: self.settings.setValue('map_reduce_concurrency', value))
+        options_layout.addWidget(self.map_reduce_checkbox)
+        options_layout.addWidget(self.concurrency_spinbox)
+
+        # Retrieval sends only the nodes most similar to the question, found by embeddings
+        self.retrieval_checkbox = QCheckBox("Retrieve")
+        self.retrieval_checkbox.setToolTip("Send only the nodes most similar to the question and their path neighbours")
+        self.retrieval_checkbox.setChecked(self.settings.value('retrieval_enabled', False, type=bool))
+        self.retrieval_checkbox.toggled.connect(
+            lambda checked: self.settings.setValue('retrieval_enabled', checked))
+        self.top_k_spinbox = QSpinBox()
+        self.top_k_spinbox.setRange(1, 100)
+        self.top_k_spinbox.setPrefix("top ")
+        self.top_k_spinbox.setToolTip("Number of most similar nodes to send")
+        self.top_k_spinbox.setValue(self.settings.value('retrieval_top_k', DEFAULT_TOP_K, type=int))
+        self.top_k_spinbox.valueChanged.connect(
+            lambda value: self.settings.setValue('retrieval_top_k', value))
+        self.embedding_model_selector = QComboBox()
+        self.embedding_model_selector.setEditable(True)
+        self.embedding_model_selector.setToolTip("Embedding model used for retrieval")
+        self.embedding_model_selector.setEditText(
+            self.settings.value('embedding_model', DEFAULT_EMBEDDING_MODEL))
+        self.embedding_model_selector.currentTextChanged.connect(
+            lambda model: self.settings.setValue('embedding_model', model))
+        if numpy is None:
+            self.retrieval_checkbox.setChecked(False)
+            self.retrieval_checkbox.setEnabled(False)
+            self.retrieval_checkbox.setToolTip("Install numpy to enable retrieval")
+        options_layout.addWidget(self.retrieval_checkbox)
+        options_layout.addWidget(self.top_k_spinbox)
+        options_layout.addWidget(self.embedding_model_selector)
+        options_layout.addStretch()
         
         # Add Clear and Save buttons
         self.clear_button = QPushButton("Clear")
@@ -117,15 +256,52 @@ class ChatPanel(QWidget):
             self.current_speech = None
 
         layout.addWidget(input_frame)
+        layout.addLayout(options_layout)
         
         # Define server endpoints
         self.server_endpoints = {
             "Ollama": "http://localhost:11434",
             "LM Studio": "http://127.0.0.1:1234"
         }
+
+        # Servers are checked in the background; their model lists and details come from the checks
+        self.server_monitor = ServerMonitor(self.server_endpoints)
+        self.server_monitor.updated.connect(self.on_server_checked)
+        self.reported = set()  # Servers whose next check result is reported in the chat
+        self.context_tasks = {}  # (server, model) -> running BackgroundTask
+        self.context_lengths = {}  # (server, model) -> context length, None if unknown
+
+        # Questions are queued and answered a few at a time per server
+        self.request_queue = RequestQueue(self.start_job)
+        self.request_queue.changed.connect(self.update_queue)
+        for server in self.server_endpoints:
+            limit = self.settings.value(f'server_concurrency/{server}', DEFAULT_SERVER_CONCURRENCY, type=int)
+            self.request_queue.set_limit(server, limit)
+        self.show_server_concurrency(self.server_selector.currentText())
+        self.server_concurrency_spinbox.valueChanged.connect(self.set_server_concurrency)
+        self.server_selector.currentTextChanged.connect(self.show_server_concurrency)
+
+        # Conversations per selected path: follow-up questions only send the new question
+        self.conversations = {}  # (server, model, path key) -> {'server', 'model', 'path_text', 'messages'}
+
+        # Node embeddings for retrieval, stored next to the project file
+        self.project_filename = None
+        self.embedding_index = EmbeddingIndex()
+        self.index_save_task = None
+        self.index_save_pending = False
+
+        cache_dir = QStandardPaths.writableLocation(QStandardPaths.GenericCacheLocation)
+        self.response_cache = ResponseCache(os.path.join(cache_dir, 'Dou', 'responses.json'))
+        # The cache file is read and written on worker threads
+        self.cache_save_task = None
+        self.cache_save_pending = False
+        self.cache_load_task = BackgroundTask(self.response_cache.read)
+        self.cache_load_task.finished.connect(self.on_response_cache_read)
+        self.cache_load_task.start()
         
-        # Initial model fetch
+        # Initial model fetch, then keep checking the servers
         self.fetch_models()
+        self.server_monitor.start()
 
         # Sync color selector initially if a node is selected
         if self.canvas.selected_node:
@@ -138,38 +314,130 @@ class ChatPanel(QWidget):
         if color.isValid():
             self.canvas.set_background_color(color)
 
-    def fetch_models(self):
+    def fetch_models(self, use_cache=True):
+        """Fill the model selector for the current server without blocking the GUI"""
         selected_server = self.server_selector.currentText()
-        
-        if selected_server == "Ollama":
-            try:
-                response = requests.get(f'{self.server_endpoints["Ollama"]}/api/tags')
-                if response.status_code == 200:
-                    models = response.json()['models']
-                    self.model_selector.clear()
-                    for model in models:
-                        self.model_selector.addItem(model['name'])
-                    self.add_to_chat("Ollama models refreshed successfully")
-                else:
-                    self.add_to_chat("Error: Could not fetch Ollama models")
-            except Exception as e:
-                self.add_to_chat(f"Error connecting to Ollama: {str(e)}\nMake sure Ollama is running (ollama serve)")
-        
-        elif selected_server == "LM Studio":
-            try:
-                # LM Studio models endpoint
-                response = requests.get(f'{self.server_endpoints["LM Studio"]}/v1/models')
-                if response.status_code == 200:
-                    models = response.json()['data']
-                    self.model_selector.clear()
-                    for model in models:
-                        self.model_selector.addItem(model['id'])
-                    self.add_to_chat("LM Studio models refreshed successfully")
-                else:
-                    self.add_to_chat("Error: Could not fetch LM Studio models")
-            except Exception as e:
-                self.add_to_chat(f"Error connecting to LM Studio: {str(e)}\nMake sure LM Studio is running with local server enabled")
+        self.show_server_status()
+        if use_cache and self.server_monitor.is_up(selected_server) and self.server_monitor.is_fresh(selected_server):
+            self.show_models(self.server_monitor.models(selected_server))
+            return
+
+        # Don't offer the previous server's models while the new list loads
+        if self.model_selector.property("server") != selected_server:
+            self.show_models([])
+        self.reported.add(selected_server)
+        self.server_monitor.probe(selected_server, force=not use_cache)
+
+    def refresh_models(self):
+        """Ask the current server for its models, bypassing the last check"""
+        self.fetch_models(use_cache=False)
+
+    def on_server_checked(self, server):
+        """Show the result of a background check of a server"""
+        status = self.server_monitor.status[server]
+        error = status['error']
+        if server == self.server_selector.currentText():
+            models = self.server_monitor.models(server)
+            if error is None and (self.model_selector.property("server") != server
+                                  or models != [self.model_selector.itemText(i)
+                                                for i in range(self.model_selector.count())]):
+                self.show_models(models)
+            self.show_server_status()
+        if server not in self.reported:
+            return  # Periodic checks only update the status
+        self.reported.discard(server)
+
+        if error is None:
+            self.add_to_chat(f"{server} models refreshed successfully")
+        elif isinstance(error, requests.exceptions.HTTPError):
+            self.add_to_chat(f"Error: Could not fetch {server} models")
+        elif server == "Ollama":
+            self.add_to_chat(f"Error connecting to Ollama: {str(error)}\nMake sure Ollama is running (ollama serve)")
+        else:
+            self.add_to_chat(f"Error connecting to LM Studio: {str(error)}\nMake sure LM Studio is running with local server enabled")
+
+    def show_server_status(self):
+        """Show whether the selected server is up, with details of the selected model as tooltip"""
+        server = self.server_selector.currentText()
+        status = self.server_monitor.status.get(server)
+        if not status:
+            self.server_status_label.setText("<span style='color:gray'>●</span>")
+            self.server_status_label.setToolTip(f"Checking {server}...")
+            return
+        if status['up']:
+            self.server_status_label.setText(
+                f"<span style='color:green'>●</span> {status['latency'] * 1000:.0f} ms")
+            lines = [f"{server} is up"]
+            info = self.server_monitor.model_info(server, self.model_selector.currentText())
+            if info:
+                lines.append(self.describe_model(info))
+        else:
+            self.server_status_label.setText("<span style='color:red'>●</span> down")
+            lines = [f"{server} is not responding: {status['error']}"]
+        self.server_status_label.setToolTip("\n".join(lines))
+
+    def describe_model(self, info):
+        """One-line summary of a model's details, such as: llama3, loaded, 8B Q4_K_M, 4.1 GB, 8,192 tokens context"""
+        parts = [info['name']]
+        if 'loaded' in info:
+            parts.append("loaded" if info['loaded'] else "not loaded")
+        size = " ".join(filter(None, [info.get('parameter_size'), info.get('quantization')]))
+        if size:
+            parts.append(size)
+        if info.get('size'):
+            parts.append(f"{info['size'] / 1e9:.1f} GB")
+        if info.get('context_length'):
+            parts.append(f"{info['context_length']:,} tokens context")
+        return ", ".join(parts)
+
+    def show_models(self, models):
+        """Replace the model list, keeping the selected model when it is still offered"""
+        current_model = self.model_selector.currentText()
+        self.model_selector.clear()
+        self.model_selector.addItems(models)
+        server = self.server_selector.currentText()
+        for i, model in enumerate(models):
+            info = self.server_monitor.model_info(server, model)
+            if info:
+                self.model_selector.setItemData(i, self.describe_model(info), Qt.ToolTipRole)
+        index = self.model_selector.findText(current_model)
+        if index != -1:
+            self.model_selector.setCurrentIndex(index)
+        self.model_selector.setProperty("server", self.server_selector.currentText())
+
+        # Offer the same models for embeddings, keeping the chosen name
+        embedding_model = self.embedding_model_selector.currentText()
+        self.embedding_model_selector.blockSignals(True)
+        self.embedding_model_selector.clear()
+        self.embedding_model_selector.addItems(models)
+        self.embedding_model_selector.setEditText(embedding_model)
+        self.embedding_model_selector.blockSignals(False)
             
+    def fetch_context_length(self, model):
+        """Look up the selected model's context length in the background"""
+        key = (self.server_selector.currentText(), model)
+        if not model or key in self.context_lengths or key in self.context_tasks:
+            return
+        task = BackgroundTask(get_context_length, key[0], self.server_endpoints[key[0]], model)
+        task.key = key
+        task.finished.connect(self.on_context_length_fetched)
+        self.context_tasks[key] = task
+        task.start()
+
+    def on_context_length_fetched(self, length, error):
+        task = self.sender()
+        if task is None or self.context_tasks.get(task.key) is not task:
+            return
+        del self.context_tasks[task.key]
+        # Unknown lengths fall back to the default rather than being asked again
+        self.context_lengths[task.key] = None if error else length
+
+    def get_context_length(self, server, model):
+        """Context length to fit the prompt into: configured, reported or default"""
+        return (self.context_spinbox.value() or self.context_lengths.get((server, model))
+                or self.server_monitor.model_info(server, model).get('context_length')
+                or DEFAULT_CONTEXT_LENGTH)
+
     def update_path_list(self):
         self.path_selector.clear()
         self.path_selector.addItem("All Paths")
@@ -180,206 +448,529 @@ class ChatPanel(QWidget):
             title = first_node.title if first_node else f"Path {i}"
             self.path_selector.addItem(title, path)
     
-    def get_selected_path_text(self):
+    def get_selected_paths(self):
+        """Return the selected paths, each sorted by order number"""
         index = self.path_selector.currentIndex()
         if index <= 0:  # "All Paths" selected
-            all_text = []
-            for path in self.canvas.get_all_paths():
-                if path:  # Skip empty paths
-                    # Sort nodes by order number if present
-                    path.sort(key=lambda node: node.order_number if node.order_number is not None else float('inf'))
-                    path_text = "\n\n".join(f"#{node.order_number}: {node.title}\n{node.text}" 
-                                          for node in path)
-                    all_text.append(path_text)
-            return "\n\n---\n\n".join(all_text)
+            paths = [path for path in self.canvas.get_all_paths() if path]  # Skip empty paths
         else:
             path = self.path_selector.currentData()
-            if path:
-                path.sort(key=lambda node: node.order_number if node.order_number is not None else float('inf'))
-                return "\n\n".join(f"#{node.order_number}: {node.title}\n{node.text}" 
-                                 for node in path)
-            return ""
-    
-    def add_to_chat(self, text, is_markdown=False, add_newline=True):
-        """Add text to chat display, with optional markdown rendering"""
-        cursor = self.chat_display.textCursor()
-        cursor.movePosition(QTextCursor.End)
-        self.chat_display.setTextCursor(cursor)
-        
-        if is_markdown:
-            # Convert markdown to HTML with code highlighting
-            html = markdown.markdown(
-                text, 
-                extensions=['fenced_code', 'tables', 'nl2br']
-            )
-            self.chat_display.insertHtml(html)
+            paths = [path] if path else []
+        for path in paths:
+            # Sort nodes by order number if present
+            path.sort(key=lambda node: node.order_number if node.order_number is not None else float('inf'))
+        return paths
+
+    def get_selected_path_text(self):
+        return format_paths(self.get_selected_paths())
+
+    def build_prompt(self, path_text, message):
+        return f"""Here is the text from the selected nodes:
+
+{path_text}
+
+User question: {message}
+
+Please analyze the provided text and answer the question. You can use markdown formatting in your response."""
+
+    def describe_context(self, summary, context_length, available=None):
+        """One-line status of what was sent from the canvas"""
+        if available is not None:
+            included = f"{summary['included']} of {available} nodes retrieved"
+            if summary['shortened'] or summary['dropped']:
+                included += f" ({summary['shortened']} shortened, {summary['dropped']} left out)"
+        elif summary['dropped'] == 0 and summary['shortened'] == 0:
+            included = f"all {summary['total']} nodes"
         else:
-            self.chat_display.insertPlainText(text)
-        
-        # Add a line break only if requested
-        if add_newline:
-            cursor.movePosition(QTextCursor.End)
-            self.chat_display.setTextCursor(cursor)
-            self.chat_display.insertPlainText("\n")
-        
-        # Ensure new text is visible
-        self.chat_display.verticalScrollBar().setValue(
-            self.chat_display.verticalScrollBar().maximum()
-        )
-        
+            included = f"{summary['included']} of {summary['total']} nodes"
+            details = []
+            if summary['shortened']:
+                details.append(f"{summary['shortened']} shortened")
+            if summary['dropped']:
+                details.append(f"{summary['dropped']} least relevant left out")
+            included += f" ({', '.join(details)})"
+        return f"Context: {included}, about {summary['tokens']:,} of {context_length:,} tokens"
+    
+    def add_to_chat(self, text, is_markdown=False):
+        """Add a note such as an error or progress report to the chat"""
+        self.transcript.add(ChatMessage('note', text, is_markdown))
+
     def send_message(self):
+        """Queue the question with the paths and options chosen now"""
         message = self.input_field.text()
         if not message:
             return
             
         if not self.model_selector.currentText():
             self.add_to_chat("Error: No model selected. Please refresh models.")
-            self.add_to_chat("")  # Add empty line after error
             return
-            
-        self.add_to_chat(f"You: {message}")
-        self.add_to_chat("")  # Add empty line after user message
+        server = self.server_selector.currentText()
+        if self.server_monitor.is_up(server) is False:
+            # Fail now rather than after a connection timeout; the question stays in the input
+            self.add_to_chat(f"Error: {server} is not responding. Checking again...")
+            self.reported.add(server)
+            self.server_monitor.probe(server)
+            return
         self.input_field.clear()
-        self.send_button.setEnabled(False)
-        
-        # Get selected path text
-        path_text = self.get_selected_path_text()
-        
-        # Create context-aware prompt
-        full_prompt = f"""Here is the text from the selected nodes:
+
+        paths = self.get_selected_paths()
+        options = {
+            'use_cache': self.cache_checkbox.isChecked(),
+            # Shift+Send asks the model again instead of using a cached answer
+            'refresh': bool(QApplication.keyboardModifiers() & Qt.ShiftModifier),
+            'map_reduce': (self.map_reduce_checkbox.isChecked() and self.path_selector.currentIndex() <= 0
+                           and len(paths) > 1),
+            'concurrency': self.concurrency_spinbox.value(),
+            'retrieval': self.retrieval_checkbox.isChecked(),
+            'top_k': self.top_k_spinbox.value(),
+            'embedding_model': self.embedding_model_selector.currentText().strip(),
+        }
+        model = self.model_selector.currentText()
+        job = ChatJob(message, paths, server, model, self.conversation_key(server, model, paths), options)
+        self.request_queue.submit(job)
+
+    def start_job(self, job):
+        """Answer a question once the queue lets it run"""
+        self.transcript.add(ChatMessage('user', job.message))
+        if job.options['map_reduce']:
+            self.start_map_reduce(job)
+        elif job.options['retrieval']:
+            self.start_retrieval(job)
+        else:
+            self.ask(job)
+
+    def sender_job(self, attribute):
+        """The job whose current request (job.<attribute>) sent a signal, or None for stale signals"""
+        sender = self.sender()
+        job = getattr(sender, 'job', None)
+        if job is None or getattr(job, attribute) is not sender:
+            return None
+        return job
+
+    def ask(self, job, retrieved=None):
+        """Send a question about paths, continuing the conversation about them if possible.
+
+        retrieved optionally limits the text sent to the nodes with those ids.
+        """
+        paths, message, selected_server, selected_model = job.paths, job.message, job.server, job.model
+        context_length = self.get_context_length(selected_server, selected_model)
+        all_path_text = format_paths(paths)
+        conversation = self.conversations.get(job.key)
+        if (conversation and conversation['messages'] and conversation['server'] == selected_server
+                and conversation['model'] == selected_model and conversation['path_text'] == all_path_text):
+            # Follow-up: the earlier messages are an unchanged prefix the server can reuse
+            content = message
+            sent_ids = conversation['sent_ids']
+            new_ids = retrieved - sent_ids if retrieved is not None else set()
+            if new_ids:
+                # Add the newly retrieved nodes to the follow-up question
+                used = sum(estimate_tokens(m['content']) for m in conversation['messages'])
+                token_budget = (context_length - RESPONSE_RESERVE - used
+                                - estimate_tokens(self.build_follow_up("", message)))
+                extra_text, _ = fit_paths(self.filter_paths(paths, new_ids), message, max(token_budget, 0))
+                if extra_text:
+                    content = self.build_follow_up(extra_text, message)
+                    sent_ids = sent_ids | new_ids
+            messages = self.trim_conversation(
+                conversation['messages'] + [{"role": "user", "content": content}], context_length)
+            tokens = sum(estimate_tokens(m['content']) for m in messages)
+            self.add_to_chat(f"Context: follow-up question, about {tokens:,} of {context_length:,} tokens")
+        else:
+            # Fit the selected paths into the model's context, leaving room for the answer
+            prompt_paths = self.filter_paths(paths, retrieved) if retrieved is not None else paths
+            token_budget = context_length - RESPONSE_RESERVE - estimate_tokens(self.build_prompt("", message))
+            path_text, summary = fit_paths(prompt_paths, message, max(token_budget, 0))
+            messages = conversation_start(self.build_prompt(path_text, message))
+            sent_ids = {node.node_id for path in prompt_paths for node in path}
+            conversation = {'server': selected_server, 'model': selected_model,
+                            'path_text': all_path_text, 'messages': [], 'sent_ids': set()}
+            self.conversations[job.key] = conversation
+            available = sum(len(path) for path in paths) if retrieved is not None else None
+            self.add_to_chat(self.describe_context(summary, context_length, available))
+
+        job.pending_turn = (conversation, messages, sent_ids)
+        options = self.request_options(selected_server, context_length)
+        # Cache on the path text and question rather than the history, so a
+        # question asked again later in a conversation is answered from the cache
+        cache_prompt = self.build_prompt(all_path_text, message)
+        if retrieved is not None:
+            cache_prompt = f"{job.options['embedding_model']} top {job.options['top_k']}\n{cache_prompt}"
+        self.start_response(job, messages[-1]['content'], options, use_cache=job.options['use_cache'],
+                            messages=messages, cache_prompt=cache_prompt)
+
+    def build_follow_up(self, path_text, message):
+        return f"""Here is more text from the selected nodes:
 
 {path_text}
 
-User question: {message}
+User question: {message}"""
 
-Please analyze the provided text and answer the question. You can use markdown formatting in your response."""
-        
-        selected_server = self.server_selector.currentText()
-        selected_model = self.model_selector.currentText()
-        
-        try:
-            # Add "Computer says:" without a line break
-            self.add_to_chat("Computer says: ", add_newline=False)
-            
-            # Get position right after "Computer says: "
-            cursor = self.chat_display.textCursor()
-            cursor.movePosition(QTextCursor.End)
-            response_position = cursor.position()
-            current_response = ""
-            
-            if selected_server == "Ollama":
-                response = requests.post(f'{self.server_endpoints["Ollama"]}/api/generate', 
-                    json={
-                        'model': selected_model,
-                        'prompt': full_prompt,
-                        'stream': True
-                    },
-                    stream=True
-                )
-                
-                for line in response.iter_lines():
-                    if line:
-                        json_response = json.loads(line)
-                        if 'error' in json_response:
-                            self.add_to_chat(f"Error: {json_response['error']}")
-                            self.add_to_chat("")
-                            break
-                        
-                        # Append new content and re-render the whole response
-                        current_response += json_response['response']
-                        
-                        # Clean up orphaned bullet points
-                        cleaned_response = self.clean_orphaned_bullet_points(current_response)
-                        
-                        # Update the chat display
-                        self.update_chat_response(cleaned_response, response_position)
-                
-            elif selected_server == "LM Studio":
-                response = requests.post(f'{self.server_endpoints["LM Studio"]}/v1/chat/completions', 
-                    json={
-                        'model': selected_model,
-                        'messages': [
-                            {"role": "system", "content": "You are a helpful assistant."},
-                            {"role": "user", "content": full_prompt}
-                        ],
-                        'stream': True,
-                        'temperature': 0.7
-                    },
-                    stream=True,
-                    headers={"Content-Type": "application/json"}
-                )
-                
-                for line in response.iter_lines():
-                    if line:
-                        # Skip empty lines and "[DONE]"
-                        if line == b"data: [DONE]":
-                            break
-                            
-                        if line.startswith(b"data: "):
-                            try:
-                                json_str = line[6:].decode('utf-8')  # Remove "data: " prefix
-                                if json_str.strip():
-                                    json_response = json.loads(json_str)
-                                    
-                                    if 'error' in json_response:
-                                        self.add_to_chat(f"Error: {json_response['error']}")
-                                        self.add_to_chat("")
-                                        break
-                                        
-                                    if 'choices' in json_response and json_response['choices']:
-                                        delta = json_response['choices'][0].get('delta', {})
-                                        content = delta.get('content', '')
-                                        
-                                        if content:
-                                            current_response += content
-                                            cleaned_response = self.clean_orphaned_bullet_points(current_response)
-                                            self.update_chat_response(cleaned_response, response_position)
-                            except json.JSONDecodeError:
-                                # Skip invalid JSON
-                                continue
-            
-            # Add empty line after response with a paragraph break
-            self.add_to_chat("")
-            
-            # Add an explicit HTML separator
-            cursor = self.chat_display.textCursor()
-            cursor.movePosition(QTextCursor.End)
-            self.chat_display.setTextCursor(cursor)
-            self.chat_display.insertHtml("<div style='margin-top:10px'></div>")
-                    
-        except Exception as e:
-            self.add_to_chat(f"Error: Could not connect to {selected_server} - {str(e)}")
-            self.add_to_chat("")
-            
-        finally:
-            self.send_button.setEnabled(True)
-            
-    def update_chat_response(self, response_text, position):
-        """Update the chat response text at the given position"""
-        # Convert to HTML
-        html = markdown.markdown(
-            response_text, 
-            extensions=['fenced_code', 'tables', 'nl2br']
-        )
-        
-        # Explicitly close any open lists with a non-list element
-        if html.endswith("</li></ul>") or html.endswith("</li></ol>"):
-            html += "<div></div>"
-        
-        # Remove previous response and insert updated HTML
-        cursor = self.chat_display.textCursor()
-        cursor.setPosition(position)
-        cursor.movePosition(QTextCursor.End, QTextCursor.KeepAnchor)
-        cursor.removeSelectedText()
-        self.chat_display.setTextCursor(cursor)
-        self.chat_display.insertHtml(html)
-        
-        # Scroll to see latest content
-        self.chat_display.verticalScrollBar().setValue(
-            self.chat_display.verticalScrollBar().maximum()
-        )
-        
-        QApplication.processEvents()
+    def filter_paths(self, paths, node_ids):
+        """The paths reduced to the nodes with the given ids, in path order"""
+        filtered = [[node for node in path if node.node_id in node_ids] for path in paths]
+        return [path for path in filtered if path]
+
+    def start_retrieval(self, job):
+        """Embed the question and any changed nodes in the background, then ask with the closest nodes"""
+        embedding_model = job.options['embedding_model']
+        if self.embedding_index.model != embedding_model and self.project_filename:
+            # The saved index can be large; read it on a worker thread first
+            task = BackgroundTask(read_index, index_path(self.project_filename), embedding_model)
+            task.job = job
+            task.finished.connect(self.on_index_read)
+            job.retrieval_task = task
+            task.start()
+            return
+        self.start_embedding(job)
+
+    def on_index_read(self, saved, error):
+        job = self.sender_job('retrieval_task')
+        if job is None:
+            return
+        job.retrieval_task = None
+        embedding_model = job.options['embedding_model']
+        # Another question may have loaded the index, and embedded more nodes, meanwhile
+        if self.embedding_index.model != embedding_model:
+            self.embedding_index.use(embedding_model, saved)
+        self.start_embedding(job)
+
+    def start_embedding(self, job):
+        embedding_model = job.options['embedding_model']
+        self.embedding_index.prune(self.canvas.nodes)
+        nodes = list({node.node_id: node for path in job.paths for node in path}.values())
+        entries = self.embedding_index.stale(nodes, embedding_model)
+        if entries:
+            self.add_to_chat(f"Embedding {len(entries)} nodes with {embedding_model}")
+
+        task = BackgroundTask(embed, job.server, self.server_endpoints[job.server], embedding_model,
+                              [job.message] + [text for _, _, text in entries])
+        task.job = job
+        task.finished.connect(self.on_embeddings_ready)
+        job.retrieval_task = task
+        job.embedding_entries = entries
+        task.start()
+
+    def on_embeddings_ready(self, vectors, error):
+        job = self.sender_job('retrieval_task')
+        if job is None:
+            return
+        job.retrieval_task = None
+        if error is not None:
+            self.add_to_chat(f"Error: Could not embed with {job.options['embedding_model']}: {str(error)}\n"
+                             "Make sure the embedding model is available on the server")
+            self.request_queue.finish(job)
+            return
+
+        entries = job.embedding_entries
+        if entries:
+            self.embedding_index.update(entries, vectors[1:])
+            self.save_embedding_index()
+
+        # Most similar nodes plus their neighbours along each path
+        node_ids = [node.node_id for path in job.paths for node in path]
+        hits = set(self.embedding_index.search(vectors[0], job.options['top_k'], node_ids))
+        retrieved = set()
+        for path in job.paths:
+            for i, node in enumerate(path):
+                if node.node_id in hits:
+                    retrieved.update(n.node_id for n in path[max(i - 1, 0):i + 2])
+        self.ask(job, retrieved)
+
+    def set_project_file(self, filename):
+        """Use the embedding index of a newly loaded project"""
+        self.project_filename = filename
+        self.embedding_index.clear()
+
+    def project_saved(self, filename):
+        """Keep the embedding index next to the project under its new file name"""
+        self.project_filename = filename
+        if len(self.embedding_index):
+            self.save_embedding_index()
+
+    def save_embedding_index(self):
+        """Write the embedding index next to the project in the background, one write at a time"""
+        if not self.project_filename:
+            return
+        if self.index_save_task:
+            self.index_save_pending = True
+            return
+        self.index_save_task = BackgroundTask(self.embedding_index.save, index_path(self.project_filename))
+        self.index_save_task.finished.connect(self.on_embedding_index_saved)
+        self.index_save_task.start()
+
+    def on_embedding_index_saved(self, result, error):
+        self.index_save_task = None
+        if error is not None:
+            print(f"Embedding index error: {error}")
+        if self.index_save_pending:
+            self.index_save_pending = False
+            self.save_embedding_index()
+
+    def conversation_key(self, server, model, paths):
+        """Each server and model keeps its own conversation about the selected paths"""
+        if self.path_selector.currentIndex() <= 0:
+            return (server, model, 'all')
+        return (server, model, tuple(node.node_id for path in paths for node in path))
+
+    def trim_conversation(self, messages, context_length):
+        """Drop the oldest follow-up exchanges until the conversation fits the context"""
+        budget = context_length - RESPONSE_RESERVE
+        messages = list(messages)
+        # The first exchange holds the path text and stays as the common prefix
+        while len(messages) > 4 and sum(estimate_tokens(m['content']) for m in messages) > budget:
+            del messages[3:5]
+        return messages
+
+    def request_options(self, server, context_length):
+        # Ollama otherwise runs with its own default context length
+        return {'num_ctx': context_length} if server == "Ollama" else {}
+
+    def start_response(self, job, full_prompt, options, use_cache=False, messages=None, cache_prompt=None):
+        """Stream the answer to a prompt into its own chat entry, or replay it from the cache.
+
+        cache_prompt is the text the cached answer is keyed on, full_prompt if not given.
+        """
+        # The answer is rendered incrementally after "Computer says: "
+        job.response_message = self.transcript.start_response(
+            ChatMessage('assistant', server=job.server, model=job.model))
+
+        # Answer repeated questions from the cache; Shift+Send asks the model again
+        job.cache_key = None
+        if use_cache:
+            parameters = {**SAMPLING_PARAMETERS[job.server], **options}
+            cache_key = make_key(job.server, job.model, parameters, cache_prompt or full_prompt)
+            cached_response = self.response_cache.get(cache_key)
+            if cached_response is not None and not job.options['refresh']:
+                self.transcript.append(job.response_message, cached_response)
+                self.record_turn(job)
+                self.finish_response(job, "[Cached]")
+                return
+            job.cache_key = cache_key
+
+        # Stream the answer on a worker thread; tokens arrive through signals
+        request = StreamRequest(job.server, self.server_endpoints[job.server], job.model, full_prompt, options,
+                                messages)
+        request.job = job
+        request.token.connect(self.on_stream_token)
+        request.stats.connect(self.on_stream_stats)
+        request.error.connect(self.on_stream_error)
+        request.finished.connect(self.on_stream_finished)
+        job.stream_request = request
+        request.start()
+
+    def start_map_reduce(self, job):
+        """Ask about each path concurrently, then combine the answers in a final request"""
+        paths, message = job.paths, job.message
+        context_length = self.get_context_length(job.server, job.model)
+        token_budget = context_length - RESPONSE_RESERVE - estimate_tokens(
+            MAP_PROMPT.format(path_text="", question=message))
+        prompts = []
+        for path in paths:
+            path_text, _ = fit_paths([path], message, max(token_budget, 0))
+            prompts.append(MAP_PROMPT.format(path_text=path_text, question=message))
+
+        job.map_titles = [path[0].title for path in paths]
+        job.map_answers = [None] * len(paths)
+        job.context_length = context_length
+        options = self.request_options(job.server, context_length)
+        concurrency = job.options['concurrency']
+        self.add_to_chat(f"Analyzing {len(paths)} paths, {concurrency} at a time")
+
+        map_request = MapRequest(job.server, self.server_endpoints[job.server], job.model, prompts, options,
+                                 concurrency)
+        map_request.job = job
+        map_request.path_finished.connect(self.on_path_finished)
+        map_request.finished.connect(self.on_map_finished)
+        job.map_request = map_request
+        map_request.start()
+
+    def on_path_finished(self, index, answer, error):
+        job = self.sender_job('map_request')
+        if job is None:
+            return
+        job.map_answers[index] = answer if not error else None
+        progress = f"[{job.map_request.done}/{len(job.map_answers)}] {job.map_titles[index]}"
+        if error:
+            self.add_to_chat(f"{progress}: Error: {error}")
+        else:
+            # Show each path's answer as soon as it arrives
+            self.add_to_chat(f"**{progress}**\n\n{answer}", is_markdown=True)
+
+    def on_map_finished(self):
+        job = self.sender_job('map_request')
+        if job is None:
+            return
+        job.map_request = None
+        answered = [(title, answer) for title, answer in zip(job.map_titles, job.map_answers) if answer]
+        if not answered:
+            self.add_to_chat("Error: No path could be analyzed")
+            self.request_queue.finish(job)
+            return
+
+        # Share the context evenly between the path answers if they don't all fit
+        token_budget = job.context_length - RESPONSE_RESERVE - estimate_tokens(
+            REDUCE_PROMPT.format(answers="", question=job.message))
+        answer_budget = max(token_budget, 0) // len(answered)
+        sections = []
+        for title, answer in answered:
+            section = f"### {title}\n{answer.strip()}"
+            if estimate_tokens(section) > answer_budget:
+                section = shorten(section, answer_budget)
+            sections.append(section)
+        prompt = REDUCE_PROMPT.format(answers="\n\n".join(sections), question=job.message)
+        self.start_response(job, prompt, map_request.options)
+
+    def abort_job(self, job):
+        """Stop a job's request; any signals it still sends are ignored"""
+        if job.retrieval_task:
+            job.retrieval_task.cancel()
+        if job.map_request:
+            job.map_request.stop()
+        if job.stream_request:
+            job.stream_request.stop()
+        job.retrieval_task = job.map_request = job.stream_request = None
+
+    def stop_job(self, job):
+        """Abort a running job and free its slot now.
+
+        A request still waiting for the server's first response can't be
+        interrupted, so the job doesn't wait for it to end.
+        """
+        if job.state != 'running':
+            return
+        streaming = job.stream_request is not None
+        self.abort_job(job)
+        if streaming:
+            self.finish_response(job, "[Stopped]")
+        else:
+            self.add_to_chat("[Stopped]")
+            self.request_queue.finish(job)
+
+    def stop_message(self):
+        """Abort the responses being streamed and drop the queued questions"""
+        for job in list(self.request_queue.queued):
+            self.request_queue.cancel(job)
+        for job in list(self.request_queue.running):
+            self.stop_job(job)
+
+    def cancel_queued(self):
+        """Drop the question selected in the queue, or stop it if it is being answered"""
+        item = self.queue_list.currentItem()
+        if item is None:
+            return
+        job = item.data(Qt.UserRole)
+        if job.state == 'queued':
+            self.request_queue.cancel(job)
+        elif job.state == 'running':
+            self.stop_job(job)
+
+    def move_queued(self, offset):
+        item = self.queue_list.currentItem()
+        if item is None:
+            return
+        job = item.data(Qt.UserRole)
+        self.request_queue.move(job, offset)
+        # Keep the moved question selected
+        for row in range(self.queue_list.count()):
+            if self.queue_list.item(row).data(Qt.UserRole) is job:
+                self.queue_list.setCurrentRow(row)
+
+    def update_queue(self):
+        """Show the running and queued questions; the queue is hidden when empty"""
+        self.stop_button.setEnabled(bool(self.request_queue))
+        self.queue_list.clear()
+        for job in self.request_queue.running + self.request_queue.queued:
+            state = "Answering" if job.state == 'running' else "Queued"
+            item = QListWidgetItem(f"{state}: {job.describe()}")
+            item.setData(Qt.UserRole, job)
+            self.queue_list.addItem(item)
+        self.queue_frame.setVisible(bool(self.request_queue))
+
+    def set_server_concurrency(self, value):
+        server = self.server_selector.currentText()
+        self.settings.setValue(f'server_concurrency/{server}', value)
+        self.request_queue.set_limit(server, value)
+
+    def show_server_concurrency(self, server):
+        self.server_concurrency_spinbox.blockSignals(True)
+        self.server_concurrency_spinbox.setValue(self.request_queue.limit(server))
+        self.server_concurrency_spinbox.blockSignals(False)
+
+    def on_stream_token(self, token):
+        job = self.sender_job('stream_request')
+        if job is None:
+            return
+        # Finished markdown blocks are rendered once, the display refreshes at a fixed rate
+        self.transcript.append(job.response_message, token)
+
+    def on_stream_stats(self, stats):
+        job = self.sender_job('stream_request')
+        if job is None:
+            return
+        # Shown after the answer, e.g. tokens per second
+        job.response_message.stats = stats
+
+    def on_stream_error(self, message):
+        job = self.sender_job('stream_request')
+        if job is None:
+            return
+        # Shown after the partial answer once the stream finishes
+        job.response_message.error = message
+
+    def on_stream_finished(self):
+        job = self.sender_job('stream_request')
+        if job is None:
+            return
+        job.stream_request = None
+
+        # Only complete answers are cached
+        answer = job.response_message.text
+        complete = not job.response_message.error and answer
+        if job.cache_key and complete:
+            self.response_cache.put(job.cache_key, answer)
+            self.save_response_cache()
+        if complete:
+            self.record_turn(job)
+        self.finish_response(job)
+
+    def on_response_cache_read(self, entries, error):
+        self.cache_load_task = None
+        stored = len(self.response_cache)
+        self.response_cache.merge(entries or [])
+        if stored:
+            self.save_response_cache()  # Answers stored while the file was read
+
+    def save_response_cache(self):
+        """Write the response cache in the background, one write at a time"""
+        if not self.response_cache.loaded:
+            return  # Written once the file has been read, so its entries are kept
+        if self.cache_save_task:
+            self.cache_save_pending = True
+            return
+        self.cache_save_task = BackgroundTask(self.response_cache.write, self.response_cache.snapshot())
+        self.cache_save_task.finished.connect(self.on_response_cache_saved)
+        self.cache_save_task.start()
+
+    def on_response_cache_saved(self, result, error):
+        self.cache_save_task = None
+        if error is not None:
+            print(f"Response cache error: {error}")
+        if self.cache_save_pending:
+            self.cache_save_pending = False
+            self.save_response_cache()
+
+    def record_turn(self, job):
+        """Add the question and its complete answer to the conversation"""
+        if job.pending_turn:
+            conversation, messages, sent_ids = job.pending_turn
+            conversation['messages'] = messages + [{"role": "assistant", "content": job.response_message.text}]
+            conversation['sent_ids'] = sent_ids
+            job.pending_turn = None
+
+    def finish_response(self, job, marker=None):
+        """Render the rest of the response, with an optional note such as [Stopped], and free its slot"""
+        self.transcript.finish_response(job.response_message, marker)
+        self.request_queue.finish(job)
 
     def clean_orphaned_bullet_points(self, text):
         """Clean up orphaned bullet points at the end of responses"""
@@ -404,7 +995,13 @@ Please analyze the provided text and answer the question. You can use markdown f
     
     def clear_chat(self):
         """Clear the chat display"""
-        self.chat_display.clear()
+        # Abandon running and queued questions; remaining signals of their requests are ignored
+        for job in self.request_queue.running:
+            self.abort_job(job)
+        self.request_queue.clear()
+        self.transcript.clear()
+        # Start new conversations
+        self.conversations.clear()
 
     def save_chat(self):
         """Save the chat content to a text file or markdown file"""
@@ -419,48 +1016,11 @@ Please analyze the provided text and answer the question. You can use markdown f
             try:
                 # Determine if markdown based on selected filter or file extension
                 is_markdown = selected_filter == "Markdown Files (*.md)" or filename.lower().endswith('.md')
-                
-                if is_markdown:
-                    # For markdown files, preserve the markdown formatting
-                    content = self.chat_display.toPlainText()
-                    formatted_content = ""
-                    
-                    # Process content line by line for markdown formatting
-                    lines = content.split('\n')
-                    i = 0
-                    while i < len(lines):
-                        line = lines[i]
-                        
-                        # Format user messages
-                        if line.startswith("You:"):
-                            formatted_content += f"**{line}**\n\n"
-                        # Format computer responses
-                        elif line.startswith("Computer says:"):
-                            formatted_content += f"**{line}**\n\n"
-                            # The response is already in markdown format, preserve it
-                            i += 1
-                            response_text = ""
-                            while i < len(lines) and not (lines[i].startswith("You:") or 
-                                                         lines[i].startswith("Computer says:") or 
-                                                         lines[i].strip() == ""):
-                                response_text += lines[i] + "\n"
-                                i += 1
-                            if response_text:
-                                formatted_content += response_text + "\n"
-                            continue
-                        # Keep error messages and other content as is
-                        else:
-                            formatted_content += line + "\n"
-                        
-                        i += 1
-                    
-                    with open(filename, 'w', encoding='utf-8') as file:
-                        file.write(formatted_content)
-                else:
-                    # For text files, get plain text (strips markdown formatting)
-                    with open(filename, 'w', encoding='utf-8') as file:
-                        file.write(self.chat_display.toPlainText())
-                        
+
+                # Written message by message from the transcript, with the answers' raw markdown
+                with open(filename, 'w', encoding='utf-8') as file:
+                    self.transcript.write(file, is_markdown)
+
             except Exception as e:
                 QMessageBox.critical(
                     self,
@@ -491,6 +1051,47 @@ Please analyze the provided text and answer the question. You can use markdown f
         for node in selected_nodes:
             node.set_color(color_name)
 
+    def report_duplicates(self):
+        """Find near-duplicate nodes and list them in the chat; returns the nodes involved"""
+        start = time.perf_counter()
+        groups, overlaps = self.canvas.find_duplicates()
+        elapsed = time.perf_counter() - start
+        if not groups and not overlaps:
+            self.add_to_chat(f"No near-duplicate nodes found ({elapsed * 1000:.0f} ms)")
+            return []
+
+        describe = lambda node: f"#{node.order_number} {node.title}"
+        lines = [f"Found {len(groups)} groups of near-duplicate nodes and {len(overlaps)} overlapping pairs "
+                 f"({elapsed * 1000:.0f} ms)"]
+        for group in groups[:MAX_LISTED_DUPLICATES]:
+            lines.append("- Near-duplicates: " + ", ".join(describe(node) for node in group))
+        for node_a, node_b, share in overlaps[:MAX_LISTED_DUPLICATES]:
+            lines.append(f"- Overlap: {describe(node_a)} and {describe(node_b)} ({share:.0%} shared)")
+        hidden = max(len(groups) - MAX_LISTED_DUPLICATES, 0) + max(len(overlaps) - MAX_LISTED_DUPLICATES, 0)
+        if hidden:
+            lines.append(f"- ... and {hidden} more")
+        self.add_to_chat("\n".join(lines))
+
+        nodes = {}
+        for group in groups:
+            nodes.update((node.node_id, node) for node in group)
+        for node_a, node_b, _ in overlaps:
+            nodes[node_a.node_id] = node_a
+            nodes[node_b.node_id] = node_b
+        return list(nodes.values())
+
+    def select_duplicates(self):
+        """Select every node that has a near-duplicate or overlapping node"""
+        self.canvas.select_nodes(self.report_duplicates())
+
+    def label_duplicates(self):
+        """Give near-duplicate nodes the colour chosen in the Colour Label selector"""
+        nodes = self.report_duplicates()
+        color_name = self.color_selector.currentText()
+        for node in nodes:
+            node.set_color(color_name)
+        self.canvas.select_nodes(nodes)
+
     def clear_canvas(self):
         """Clear all nodes from the canvas."""
         reply = QMessageBox.question(self, 'Clear Canvas', 
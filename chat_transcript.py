@@ -0,0 +1,220 @@
+"""Structured chat transcript with a bounded display.
+
+Every message is kept with its role, raw text, model and timestamps. Only the
+most recent messages are rendered into the chat's QTextBrowser; older pages
+are rendered again when the user scrolls to the top, so long sessions stay
+quick to append to and scroll. Saving writes straight from the message list.
+"""
+from PySide6.QtCore import *
+from PySide6.QtGui import QTextCursor
+import time
+import markdown
+from markdown_stream import StreamingMarkdownRenderer, MARKDOWN_EXTENSIONS
+from stream_parser import format_stats
+
+# Messages rendered at most, and how many more are shown per scroll to the top
+WINDOW_SIZE = 150
+PAGE_SIZE = 50
+
+ROLE_NAMES = {'user': "You", 'assistant': "Computer says"}
+
+
+class ChatMessage:
+    """One entry of the chat: a question, an answer or a note such as an error"""
+
+    def __init__(self, role, text="", is_markdown=False, server=None, model=None):
+        self.role = role  # 'user', 'assistant' or 'note'
+        self.text = text  # Raw text; markdown for answers
+        self.is_markdown = is_markdown or role == 'assistant'
+        self.server = server
+        self.model = model
+        self.created = time.time()
+        self.finished = None  # When an answer was complete
+        self.error = ""
+        self.marker = ""  # Note shown after an answer, such as [Stopped]
+        self.stats = None  # Token counts and timings of a streamed answer
+
+    def heading(self, is_markdown=False):
+        """Role with model and time, as used in saved chats"""
+        name = ROLE_NAMES[self.role]
+        if is_markdown:
+            name = f"**{name}**"
+        details = [self.model] if self.model else []
+        details.append(time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.created)))
+        if self.finished is not None:
+            details.append(f"{self.finished - self.created:.1f} s")
+        return f"{name} ({', '.join(details)}):"
+
+    def ending(self):
+        """Lines shown after an answer"""
+        lines = [f"Error: {self.error}"] if self.error else []
+        if self.marker:
+            lines.append(self.marker)
+        if self.stats:
+            lines.append(f"[{format_stats(self.stats)}]")
+        return lines
+
+    def to_text(self):
+        if self.role == 'note':
+            return f"{self.text}\n\n"
+        return "\n".join([self.heading(), self.text.strip()] + self.ending()) + "\n\n"
+
+    def to_markdown(self):
+        if self.role == 'note':
+            return f"{self.text}\n\n"
+        return "\n\n".join([self.heading(True), self.text.strip()] + self.ending()) + "\n\n"
+
+
+class ChatTranscript(QObject):
+    """Message list of a chat, shown in a QTextBrowser a window of messages at a time.
+
+    Several answers can stream at once, each into its own entry.
+    """
+
+    def __init__(self, display, clean=None, window_size=WINDOW_SIZE, page_size=PAGE_SIZE):
+        super().__init__()
+        self.display = display
+        self.clean = clean  # Cleanup for the end of streamed answers
+        self.window_size = window_size
+        self.page_size = page_size
+        self.messages = []
+        self.first_shown = 0  # Index of the oldest rendered message
+        self.starts = []  # Cursor at the start of each rendered message
+        self.open = {}  # Answer being streamed -> its StreamingMarkdownRenderer
+        self.rendering = False
+        display.verticalScrollBar().valueChanged.connect(self.on_scroll)
+
+    def __len__(self):
+        return len(self.messages)
+
+    def clear(self):
+        for renderer in self.open.values():
+            renderer.timer.stop()
+        self.messages = []
+        self.first_shown = 0
+        self.starts = []
+        self.open = {}
+        self.display.clear()
+
+    def add(self, message, streaming=False):
+        """Append a message and show it, dropping the oldest rendered ones when there are too many"""
+        shown = len(self.messages) - self.first_shown
+        if shown >= self.window_size + self.page_size:
+            self.drop_oldest(shown - self.window_size + 1)
+        self.messages.append(message)
+        if streaming:
+            self.open[message] = None
+        self.render(message)
+        self.scroll_to_end()
+        return message
+
+    def start_response(self, message):
+        """Add an answer whose text is streamed in with append()"""
+        return self.add(message, streaming=True)
+
+    def append(self, message, token):
+        message.text += token
+        self.open[message].append(token)
+
+    def finish_response(self, message, marker=None):
+        """Complete a streamed answer, with an optional note such as [Stopped]"""
+        message.finished = time.time()
+        message.marker = marker or ""
+        renderer = self.open.pop(message)
+        renderer.finish()
+        cursor = QTextCursor(renderer.end)
+        cursor.setKeepPositionOnInsert(False)
+        cursor.insertText("".join(f"\n{line}" for line in message.ending()))
+
+    def write(self, file, is_markdown=False):
+        """Write the whole chat to an open text file"""
+        for message in self.messages:
+            file.write(message.to_markdown() if is_markdown else message.to_text())
+
+    def end_cursor(self):
+        cursor = self.display.textCursor()
+        cursor.movePosition(QTextCursor.End)
+        self.display.setTextCursor(cursor)
+        return cursor
+
+    def insert_plain(self, text):
+        self.end_cursor()
+        self.display.insertPlainText(text)
+
+    def insert_html(self, html):
+        self.end_cursor()
+        self.display.insertHtml(html)
+
+    def scroll_to_end(self):
+        bar = self.display.verticalScrollBar()
+        bar.setValue(bar.maximum())
+
+    def render(self, message):
+        """Show a message at the end of the display"""
+        start = self.end_cursor()
+        start.setKeepPositionOnInsert(True)  # Stays before the message's own text
+        self.starts.append(start)
+        if message.role == 'assistant':
+            self.insert_plain(f"{ROLE_NAMES['assistant']}: ")
+            renderer = StreamingMarkdownRenderer(self.display, self.end_cursor().position(), clean=self.clean)
+            renderer.append(message.text)
+            if message in self.open:
+                # Text streamed in later goes between the renderer's cursors
+                renderer.render()
+                self.open[message] = renderer
+            else:
+                renderer.finish()
+                self.insert_plain("".join(f"\n{line}" for line in message.ending()))
+            # Paragraph break before the next message
+            self.insert_plain("\n")
+            self.insert_html("<div style='margin-top:10px'></div>")
+        elif message.is_markdown:
+            self.insert_html(markdown.markdown(message.text, extensions=MARKDOWN_EXTENSIONS))
+            self.insert_plain("\n\n")
+        elif message.role == 'user':
+            self.insert_plain(f"{ROLE_NAMES['user']}: {message.text}\n\n")
+        else:
+            self.insert_plain(f"{message.text}\n\n")
+
+    def show_window(self, first):
+        """Render the messages from index first onwards in place of the current ones"""
+        self.rendering = True
+        for renderer in self.open.values():
+            renderer.timer.stop()
+        self.display.clear()
+        self.first_shown = first
+        self.starts = []
+        if first:
+            self.insert_plain(self.earlier_note())
+        for message in self.messages[first:]:
+            self.render(message)
+        self.rendering = False
+
+    def earlier_note(self):
+        return f"[{self.first_shown} earlier messages, scroll up to show them]\n\n"
+
+    def drop_oldest(self, count):
+        """Remove up to count of the oldest rendered messages from the top of the display"""
+        # Answers still streaming stay, along with everything after them
+        for i in range(count):
+            if self.messages[self.first_shown + i] in self.open:
+                count = i
+                break
+        if not count:
+            return
+        cursor = QTextCursor(self.display.document())
+        cursor.setPosition(self.starts[count].position(), QTextCursor.KeepAnchor)
+        cursor.removeSelectedText()
+        self.first_shown += count
+        self.starts = self.starts[count:]
+        cursor.insertText(self.earlier_note())
+
+    def on_scroll(self, value):
+        # Page in older messages at the top
+        bar = self.display.verticalScrollBar()
+        if self.rendering or self.first_shown == 0 or value != bar.minimum():
+            return
+        distance = bar.maximum() - value
+        self.show_window(max(self.first_shown - self.page_size, 0))
+        # Keep the previously oldest message where it was on screen
+        bar.setValue(bar.maximum() - distance)
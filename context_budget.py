@@ -0,0 +1,101 @@
+"""Fitting path text into a model's context window.
+
+Token counts are estimated locally, without a tokenizer: about four characters
+per token for ASCII text and one token per character for other scripts. When
+the selected paths do not fit, the nodes least related to the question are
+shortened or dropped first.
+"""
+import re
+
+# Context length assumed when the server doesn't report the model's
+DEFAULT_CONTEXT_LENGTH = 4096
+
+# Tokens kept free for the answer
+RESPONSE_RESERVE = 1024
+
+# A node is only shortened if at least this many tokens of it still fit
+MIN_SHORTENED_TOKENS = 32
+
+PATH_SEPARATOR = "\n\n---\n\n"
+NODE_SEPARATOR = "\n\n"
+
+WORD_RE = re.compile(r'\w+')
+
+
+def estimate_tokens(text):
+    """Quick token estimate, erring on the high side for non-English text"""
+    ascii_length = len(text.encode('ascii', 'ignore'))
+    return (ascii_length + 3) // 4 + (len(text) - ascii_length)
+
+
+def format_node(node):
+    return f"#{node.order_number}: {node.title}\n{node.text}"
+
+
+def format_paths(paths):
+    """Prompt text for paths of nodes, each already in order"""
+    return PATH_SEPARATOR.join(NODE_SEPARATOR.join(format_node(node) for node in path)
+                               for path in paths if path)
+
+
+def relevance(node_text, question_words):
+    """Share of the question's words that appear in a node"""
+    if not question_words:
+        return 0
+    node_words = set(WORD_RE.findall(node_text.lower()))
+    return len(question_words & node_words) / len(question_words)
+
+
+def shorten(text, tokens):
+    """Cut text to roughly the given number of tokens"""
+    length = len(text)
+    while length > 0 and estimate_tokens(text[:length]) > tokens:
+        length = length * tokens // max(estimate_tokens(text[:length]), 1)
+    return text[:length].rstrip() + " [...]"
+
+
+def fit_paths(paths, question, token_budget):
+    """Return (prompt text, summary) for the paths cut to a token budget.
+
+    The most relevant nodes are kept whole, the next one may be shortened and
+    the rest are dropped; the kept nodes stay in path order. The summary holds
+    counts of nodes in total, included, shortened and dropped, and the
+    estimated tokens.
+    """
+    question_words = set(WORD_RE.findall(question.lower()))
+    candidates = []  # (relevance, position, formatted node text)
+    for path_index, path in enumerate(paths):
+        for node_index, node in enumerate(path):
+            node_text = format_node(node)
+            candidates.append((relevance(node_text, question_words), (path_index, node_index), node_text))
+
+    separator_tokens = estimate_tokens(PATH_SEPARATOR)
+    kept = {}  # position -> node text
+    shortened = 0
+    used = 0
+    # Most relevant first; among equals, earlier nodes first
+    for score, position, node_text in sorted(candidates, key=lambda c: (-c[0], c[1])):
+        tokens = estimate_tokens(node_text) + separator_tokens
+        if used + tokens <= token_budget:
+            kept[position] = node_text
+            used += tokens
+        elif token_budget - used - separator_tokens >= MIN_SHORTENED_TOKENS:
+            kept[position] = shorten(node_text, token_budget - used - separator_tokens)
+            used = token_budget
+            shortened += 1
+
+    kept_paths = []
+    for path_index, path in enumerate(paths):
+        texts = [kept[(path_index, i)] for i in range(len(path)) if (path_index, i) in kept]
+        if texts:
+            kept_paths.append(NODE_SEPARATOR.join(texts))
+    text = PATH_SEPARATOR.join(kept_paths)
+
+    summary = {
+        'total': len(candidates),
+        'included': len(kept),
+        'shortened': shortened,
+        'dropped': len(candidates) - len(kept),
+        'tokens': estimate_tokens(text),
+    }
+    return text, summary
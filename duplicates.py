@@ -0,0 +1,208 @@
+"""Near-duplicate detection of node texts without an LLM.
+
+Texts are split into overlapping character shingles and summarized with
+MinHash signatures; locality-sensitive hashing over bands of the signatures
+finds candidate pairs, which are then checked against their exact shingle
+sets. Signatures are kept per node and only recomputed for nodes whose text
+changed.
+"""
+
+# Optional; duplicate detection is unavailable without it
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+SHINGLE_SIZE = 5
+BANDS = 16
+ROWS_PER_BAND = 4  # Pairs with a Jaccard similarity above about 0.5 become candidates
+NUM_HASHES = BANDS * ROWS_PER_BAND
+
+# Jaccard similarity of near-duplicates, and share of the smaller text found in the larger for overlaps
+DUPLICATE_THRESHOLD = 0.8
+OVERLAP_THRESHOLD = 0.8
+
+
+def normalize(text):
+    return ' '.join(text.lower().split())
+
+
+def shingle_hashes(texts, size=SHINGLE_SIZE):
+    """Sorted unique 32-bit hashes of the character shingles of each normalized text.
+
+    All texts are hashed in one pass: a polynomial hash of every window of
+    code points is computed over the concatenated texts, skipping windows that
+    span two texts. Texts shorter than a shingle count as one shingle.
+    """
+    lengths = numpy.array([max(len(text), size) for text in texts], dtype=numpy.int64)
+    joined = ''.join(text.ljust(size, '\0') for text in texts)
+    codes = numpy.frombuffer(joined.encode('utf-32-le'), dtype=numpy.uint32).astype(numpy.uint64)
+    weights = numpy.cumprod(numpy.full(size, 1000003, dtype=numpy.uint64))
+
+    # Start of every window that lies within one text
+    counts = lengths - size + 1
+    offsets = numpy.concatenate(([0], numpy.cumsum(lengths)[:-1]))
+    first_window = numpy.concatenate(([0], numpy.cumsum(counts)[:-1]))
+    owners = numpy.repeat(numpy.arange(len(texts), dtype=numpy.uint64), counts)
+    starts = numpy.repeat(offsets, counts) + numpy.arange(counts.sum()) - numpy.repeat(first_window, counts)
+    hashes = codes[starts] * weights[0]
+    for i in range(1, size):
+        hashes += codes[starts + i] * weights[i]
+    hashes = (hashes ^ (hashes >> numpy.uint64(32))) & numpy.uint64(0xFFFFFFFF)
+
+    # Deduplicate per text by sorting (text, hash) keys
+    keys = numpy.sort((owners << numpy.uint64(32)) | hashes)
+    keys = keys[numpy.concatenate(([True], keys[1:] != keys[:-1]))]
+    owners = (keys >> numpy.uint64(32)).astype(numpy.int64)
+    bounds = numpy.searchsorted(owners, numpy.arange(1, len(texts)))
+    return numpy.split((keys & numpy.uint64(0xFFFFFFFF)).astype(numpy.uint32), bounds)
+
+
+class DuplicateIndex:
+    """MinHash/LSH index of node texts, updated incrementally as nodes change"""
+
+    def __init__(self, seed=1):
+        random = numpy.random.default_rng(seed)
+        # Random permutations of the 32-bit hashes: (a * x + b) mod 2^32 with odd a
+        self.a = random.integers(0, 2 ** 32, NUM_HASHES, dtype=numpy.uint32) | numpy.uint32(1)
+        self.b = random.integers(0, 2 ** 32, NUM_HASHES, dtype=numpy.uint32)
+        self.clear()
+
+    def clear(self):
+        self.entries = {}  # node_id -> (text hash, shingle hashes, band keys)
+        self.buckets = [{} for _ in range(BANDS)]  # band -> {band key: set of node_ids}
+        self.dirty = set()  # Nodes edited since the last update
+
+    def mark_edited(self, op, item):
+        """Track canvas edits; connect to NodeCanvas.edited"""
+        if op in ('create', 'text'):
+            self.dirty.add(item.node_id)
+        elif op == 'delete':
+            self.remove(item.node_id)
+        elif op == 'clear':
+            self.clear()
+
+    def signatures(self, hash_sets, chunk_size=64):
+        """MinHash signatures of shingle hash sets, one row per set"""
+        rows = []
+        for start in range(0, len(hash_sets), chunk_size):
+            chunk = hash_sets[start:start + chunk_size]
+            hashes = numpy.concatenate(chunk)
+            bounds = numpy.concatenate(([0], numpy.cumsum([len(h) for h in chunk])[:-1]))
+            values = self.a[:, None] * hashes[None, :] + self.b[:, None]
+            rows.append(numpy.minimum.reduceat(values, bounds, axis=1).T)
+        return numpy.concatenate(rows) if rows else numpy.empty((0, NUM_HASHES), numpy.uint32)
+
+    def add(self, items):
+        """Index (node_id, text) pairs, replacing earlier entries of nodes whose text changed"""
+        changed = []
+        for node_id, text in items:
+            text = normalize(text)
+            text_hash = hash(text)
+            entry = self.entries.get(node_id)
+            if entry and entry[0] == text_hash:
+                continue
+            self.remove(node_id)
+            if text:  # Empty notes are not duplicates of anything
+                changed.append((node_id, text, text_hash))
+        if not changed:
+            return
+
+        hash_sets = shingle_hashes([text for _, text, _ in changed])
+        # One key per band, combining the band's rows of the signature
+        bands = self.signatures(hash_sets).reshape(len(changed), BANDS, ROWS_PER_BAND).astype(numpy.uint64)
+        band_keys = bands[:, :, 0]
+        for row in range(1, ROWS_PER_BAND):
+            band_keys = band_keys * numpy.uint64(4294967311) + bands[:, :, row]
+        for (node_id, _, text_hash), hashes, keys in zip(changed, hash_sets, band_keys.tolist()):
+            for band, key in enumerate(keys):
+                self.buckets[band].setdefault(key, set()).add(node_id)
+            self.entries[node_id] = (text_hash, hashes, keys)
+
+    def remove(self, node_id):
+        entry = self.entries.pop(node_id, None)
+        self.dirty.discard(node_id)
+        if entry is None:
+            return
+        for band, key in enumerate(entry[2]):
+            bucket = self.buckets[band][key]
+            bucket.discard(node_id)
+            if not bucket:
+                del self.buckets[band][key]
+
+    def update(self, nodes):
+        """Bring the index in line with a {node_id: node} registry"""
+        for node_id in [node_id for node_id in self.entries if node_id not in nodes]:
+            self.remove(node_id)
+        self.add([(node_id, node.text) for node_id, node in nodes.items()
+                  if node_id in self.dirty or node_id not in self.entries])
+        self.dirty.clear()
+
+    def candidate_pairs(self, node_ids):
+        """Pairs of the given nodes that share a bucket in any band"""
+        pairs = set()
+        for buckets in self.buckets:
+            for bucket in buckets.values():
+                if len(bucket) > 1:
+                    members = sorted(bucket & node_ids)
+                    pairs.update((a, b) for i, a in enumerate(members) for b in members[i + 1:])
+        return pairs
+
+    def find(self, nodes, duplicate_threshold=DUPLICATE_THRESHOLD, overlap_threshold=OVERLAP_THRESHOLD):
+        """Return (groups, overlaps) for the nodes in a {node_id: node} registry.
+
+        groups lists sets of node ids whose texts are near-duplicates of each
+        other; overlaps lists (node_id, node_id, share) for other pairs where
+        most of the smaller text is contained in the larger, one pair for each
+        two groups (or single nodes) that overlap.
+        """
+        self.update(nodes)
+
+        # Identical texts need no comparison; check one representative per text
+        representatives = {}
+        parent = {}  # node_id -> node it was merged into; roots are absent
+
+        def find_root(node_id):
+            while node_id in parent:
+                node_id = parent[node_id]
+            return node_id
+
+        def union(a, b):
+            root_a, root_b = find_root(a), find_root(b)
+            if root_a != root_b:
+                parent[root_b] = root_a
+
+        for node_id, (text_hash, _, _) in self.entries.items():
+            if text_hash in representatives:
+                union(representatives[text_hash], node_id)
+            else:
+                representatives[text_hash] = node_id
+        unique_ids = set(representatives.values())
+
+        overlaps = []
+        for a, b in self.candidate_pairs(unique_ids):
+            hashes_a, hashes_b = self.entries[a][1], self.entries[b][1]
+            common = len(numpy.intersect1d(hashes_a, hashes_b, assume_unique=True))
+            if not common:
+                continue
+            jaccard = common / (len(hashes_a) + len(hashes_b) - common)
+            if jaccard >= duplicate_threshold:
+                union(a, b)
+            else:
+                share = common / min(len(hashes_a), len(hashes_b))
+                if share >= overlap_threshold:
+                    overlaps.append((a, b, share))
+
+        groups = {}
+        for node_id in self.entries:
+            groups.setdefault(find_root(node_id), set()).add(node_id)
+        groups = [group for group in groups.values() if len(group) > 1]
+
+        # An overlap inside a duplicate group adds nothing, and one with a group is
+        # reported once rather than for each of its members
+        strongest = {}
+        for a, b, share in overlaps:
+            roots = frozenset((find_root(a), find_root(b)))
+            if len(roots) == 2 and share > strongest.get(roots, (None, None, 0))[2]:
+                strongest[roots] = (a, b, share)
+        return groups, list(strongest.values())
@@ -0,0 +1,169 @@
+"""Embedding index of node texts for retrieval-augmented questions.
+
+Each node's title and text are embedded once through the local server; the
+vectors are kept as rows of a NumPy matrix, normalized so a single matrix
+product gives the cosine similarity of every node to a question. The index is
+stored next to the project as "<project>.dou.embeddings.npz" and only nodes
+whose content hash changed are embedded again.
+"""
+import hashlib
+import os
+import threading
+
+# Optional; retrieval is unavailable without it
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+INDEX_SUFFIX = '.embeddings.npz'
+
+
+def index_path(project_filename):
+    return project_filename + INDEX_SUFFIX
+
+
+def node_content(node):
+    return f"{node.title}\n{node.text}"
+
+
+def content_hash(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def read_index(path, model):
+    """Return (ids, hashes, matrix) of a saved index, or None if it is missing, damaged or for another model.
+
+    Doesn't touch an EmbeddingIndex, so large files can be read on a worker thread.
+    """
+    try:
+        with numpy.load(path, allow_pickle=False) as data:
+            if str(data['model']) != model:
+                return None
+            ids = [str(node_id) for node_id in data['ids']]
+            hashes = [str(text_hash) for text_hash in data['hashes']]
+            matrix = data['matrix'].astype(numpy.float32)
+    except (OSError, KeyError, ValueError):
+        return None
+    return ids, hashes, matrix
+
+
+class EmbeddingIndex:
+    """Node embeddings for one embedding model, searchable by cosine similarity"""
+
+    def __init__(self):
+        self.lock = threading.Lock()  # Saving runs on a worker thread
+        self.clear()
+
+    def clear(self, model=None):
+        with self.lock:
+            self.model = model
+            self.ids = []
+            self.hashes = []
+            self.rows = {}  # node_id -> row in matrix
+            self.matrix = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def stale(self, nodes, model):
+        """Return (node_id, hash, text) for the nodes that need embedding with a model"""
+        if model != self.model:
+            self.clear(model)
+        entries = []
+        for node in nodes:
+            text = node_content(node)
+            text_hash = content_hash(text)
+            row = self.rows.get(node.node_id)
+            if row is None or self.hashes[row] != text_hash:
+                entries.append((node.node_id, text_hash, text))
+        return entries
+
+    def update(self, entries, vectors):
+        """Store the vectors for entries returned by stale()"""
+        if not entries:
+            return
+        vectors = numpy.asarray(vectors, dtype=numpy.float32)
+        norms = numpy.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors /= numpy.maximum(norms, 1e-12)
+        with self.lock:
+            if self.matrix is not None and self.matrix.shape[1] != vectors.shape[1]:
+                # Different model output size; start over
+                self.ids, self.hashes, self.rows, self.matrix = [], [], {}, None
+            # Build new arrays so a save in progress keeps a consistent snapshot
+            ids, hashes = list(self.ids), list(self.hashes)
+            matrix = self.matrix if self.matrix is not None else numpy.empty((0, vectors.shape[1]), numpy.float32)
+            copied = False
+            new_rows = []
+            for (node_id, text_hash, _), vector in zip(entries, vectors):
+                row = self.rows.get(node_id)
+                if row is None:
+                    ids.append(node_id)
+                    hashes.append(text_hash)
+                    new_rows.append(vector)
+                else:
+                    if not copied:
+                        matrix = matrix.copy()
+                        copied = True
+                    hashes[row] = text_hash
+                    matrix[row] = vector
+            if new_rows:
+                matrix = numpy.vstack([matrix, numpy.stack(new_rows)])
+            self.ids, self.hashes, self.matrix = ids, hashes, matrix
+            self.rows = {node_id: row for row, node_id in enumerate(ids)}
+
+    def prune(self, node_ids):
+        """Drop the embeddings of nodes that are no longer on the canvas"""
+        keep = [row for row, node_id in enumerate(self.ids) if node_id in node_ids]
+        if len(keep) == len(self.ids):
+            return
+        with self.lock:
+            self.ids = [self.ids[row] for row in keep]
+            self.hashes = [self.hashes[row] for row in keep]
+            self.matrix = self.matrix[keep]
+            self.rows = {node_id: row for row, node_id in enumerate(self.ids)}
+
+    def search(self, vector, k, node_ids=None):
+        """Return the ids of the k nodes most similar to a vector, best first.
+
+        node_ids optionally restricts the search to those nodes.
+        """
+        if self.matrix is None or not self.ids or k <= 0:
+            return []
+        query = numpy.asarray(vector, dtype=numpy.float32)
+        query /= max(float(numpy.linalg.norm(query)), 1e-12)
+        if node_ids is None:
+            rows = numpy.arange(len(self.ids))
+            scores = self.matrix @ query
+        else:
+            rows = numpy.fromiter((self.rows[node_id] for node_id in node_ids if node_id in self.rows),
+                                  dtype=numpy.int64)
+            scores = self.matrix[rows] @ query
+        if len(scores) > k:
+            top = numpy.argpartition(-scores, k - 1)[:k]
+        else:
+            top = numpy.arange(len(scores))
+        top = top[numpy.argsort(-scores[top])]
+        return [self.ids[rows[i]] for i in top]
+
+    def use(self, model, saved):
+        """Replace the index with one returned by read_index"""
+        self.clear(model)
+        if saved is None:
+            return
+        ids, hashes, matrix = saved
+        with self.lock:
+            self.ids, self.hashes, self.matrix = ids, hashes, matrix
+            self.rows = {node_id: row for row, node_id in enumerate(ids)}
+
+    def save(self, path):
+        """Write the index, replacing the old file only once fully written"""
+        with self.lock:
+            model, ids, hashes, matrix = self.model, self.ids, self.hashes, self.matrix
+        if matrix is None:
+            return
+        temp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(temp_path, 'wb') as file:
+            numpy.savez(file, model=numpy.array(model or ''), ids=numpy.array(ids, dtype=str),
+                        hashes=numpy.array(hashes, dtype=str), matrix=matrix)
+        os.replace(temp_path, path)
@@ -0,0 +1,320 @@
+"""Append-only autosave journal for .dou projects.
+
+Edits made on the canvas are recorded next to the project file in
+"<project>.dou.journal", one JSON object per line with an increasing "seq".
+Entries are batched on the GUI thread and written by a single worker thread,
+which also periodically compacts the journal into the project file. The project
+file stores the last compacted "journal_seq", so after a crash only the newer
+entries are replayed.
+"""
+from PySide6.QtCore import *
+import json
+import os
+import queue
+import threading
+import project_file
+
+JOURNAL_SUFFIX = '.journal'
+
+
+def journal_path(project_filename):
+    return project_filename + JOURNAL_SUFFIX
+
+
+def read_entries(path, after_seq=0):
+    """Read the journal entries newer than after_seq, ignoring a torn last line"""
+    entries = []
+    try:
+        with open(path, 'r', encoding='utf-8') as file:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    break  # Partially written line from a crash
+                if entry.get('seq', 0) > after_seq:
+                    entries.append(entry)
+    except FileNotFoundError:
+        pass
+    return entries
+
+
+class JournalWriter:
+    """Worker thread running journal file jobs one at a time, in submission order"""
+
+    def __init__(self):
+        self.jobs = queue.Queue()
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def submit(self, job, *args):
+        self.jobs.put((job, args))
+
+    def wait(self):
+        """Block until every submitted job has run"""
+        self.jobs.join()
+
+    def run(self):
+        while True:
+            job, args = self.jobs.get()
+            try:
+                job(*args)
+            except Exception as e:
+                print(f"Journal error: {e}")
+            finally:
+                self.jobs.task_done()
+
+
+class ProjectJournal(QObject):
+    """Records canvas edits to a journal and compacts them into the project file"""
+    compacted = Signal(bool)  # Emitted from the worker thread after a compaction
+
+    # Edits whose latest value is captured when the batch is flushed
+    STATE_EDITS = ('create', 'move', 'resize', 'text', 'color')
+
+    def __init__(self, canvas, flush_interval=1000, compact_interval=5 * 60 * 1000):
+        super().__init__()
+        self.canvas = canvas
+        self.project_filename = None
+        self.seq = 0
+        self.compacted_seq = 0
+        self.pending = []  # Ordered (op, node or payload) edits not yet written
+        self.pending_state = set()  # (op, node_id) state edits already pending
+        self.replaying = False
+        self.writer = JournalWriter()
+
+        self.flush_timer = QTimer(self)
+        self.flush_timer.setSingleShot(True)
+        self.flush_timer.setInterval(flush_interval)
+        self.flush_timer.timeout.connect(self.flush)
+
+        self.compact_timer = QTimer(self)
+        self.compact_timer.setInterval(compact_interval)
+        self.compact_timer.timeout.connect(self.compact)
+
+        canvas.edited.connect(self.record)
+
+    def open(self, project_filename):
+        """Start journaling for a project that was just loaded or saved.
+
+        Returns the journal entries newer than the project file, which are
+        edits lost by an unclean exit; pass them to replay() or discard_recovered().
+        """
+        if self.project_filename and self.project_filename != project_filename:
+            self.discard()
+        self.project_filename = project_filename
+        self.compacted_seq = self.canvas.journal_seq
+        self.pending.clear()
+        self.pending_state.clear()
+        entries = read_entries(journal_path(project_filename), self.compacted_seq)
+        self.seq = max([self.compacted_seq] + [entry['seq'] for entry in entries])
+        self.compact_timer.start()
+        # A file with legacy node ids is rewritten with the first edit (see flush), not just for opening it
+        return entries
+
+    def discard_recovered(self):
+        """Drop the entries returned by open() instead of replaying them"""
+        if self.project_filename:
+            self.writer.submit(self._remove, journal_path(self.project_filename), None)
+            self.seq = self.compacted_seq
+
+    def prepare_save(self):
+        """Flush before a full save so the saved file records which entries it contains"""
+        self.flush()
+        self.canvas.journal_seq = self.seq
+
+    def saved(self, project_filename):
+        """Continue journaling after a full save, possibly under a new file name"""
+        if self.project_filename and self.project_filename != project_filename:
+            self.writer.submit(self._remove, journal_path(self.project_filename), None)
+        self.project_filename = project_filename
+        self.compacted_seq = self.canvas.journal_seq
+        self.compact_timer.start()
+
+    def record(self, op, item):
+        """Queue a canvas edit; state edits are coalesced until the next flush"""
+        if not self.project_filename or self.replaying:
+            return
+        if op in self.STATE_EDITS:
+            key = (op, item.node_id)
+            if key in self.pending_state:
+                return
+            self.pending_state.add(key)
+            self.pending.append((op, item))
+        elif op in ('connect', 'disconnect'):
+            self.pending.append((op, {'start': item.start_node.node_id,
+                                      'end': item.end_node.node_id,
+                                      'edge_type': item.edge_type}))
+        elif op == 'delete':
+            self.pending.append((op, {'id': item.node_id}))
+            # A later create of the same id (cut and paste) must be recorded again
+            self.pending_state = {key for key in self.pending_state if key[1] != item.node_id}
+        elif op == 'clear':
+            self.pending.append((op, {}))
+            self.pending_state.clear()
+        if not self.flush_timer.isActive():
+            self.flush_timer.start()
+
+    def flush(self):
+        """Turn pending edits into journal entries and append them on the worker thread"""
+        self.flush_timer.stop()
+        if not self.pending or not self.project_filename:
+            return
+        entries = []
+        for op, item in self.pending:
+            if op in self.STATE_EDITS:
+                # Capture the latest state; skip nodes deleted since the edit
+                if self.canvas.nodes.get(item.node_id) is not item:
+                    continue
+                entry = {'id': item.node_id}
+                if op == 'create':
+                    entry['node'] = self.canvas.node_data(item)
+                elif op == 'move':
+                    entry['x'], entry['y'] = item.pos().x(), item.pos().y()
+                elif op == 'resize':
+                    entry['width'], entry['height'] = item.width, item.height
+                elif op == 'text':
+                    entry['title'], entry['text'] = item.title, item.text
+                elif op == 'color':
+                    entry['color'] = item.current_color
+            else:
+                entry = dict(item)
+            self.seq += 1
+            entry['seq'] = self.seq
+            entry['op'] = op
+            entries.append(entry)
+        self.pending.clear()
+        self.pending_state.clear()
+        if not entries:
+            return
+        if self.canvas.legacy_node_ids and not self.canvas.save_task:
+            # Journal entries refer to node UUIDs the file doesn't have yet; write the whole project instead
+            self.canvas.legacy_node_ids = False
+            self.canvas.journal_seq = self.compacted_seq = self.seq
+            self.writer.submit(self._compact, self.project_filename, self.canvas.collect_project_data(),
+                               self.canvas.file_format, self.seq)
+        else:
+            self.writer.submit(self._append, journal_path(self.project_filename), entries)
+
+    def compact(self):
+        """Flush, then write the whole project and drop the journal entries it now contains"""
+        self.flush()
+        if not self.project_filename or self.seq == self.compacted_seq:
+            return
+        if self.canvas.save_task:
+            return  # Save Project is writing the file; compact after it has finished
+        self.canvas.journal_seq = self.seq
+        self.compacted_seq = self.seq
+        self.writer.submit(self._compact, self.project_filename, self.canvas.collect_project_data(),
+                           self.canvas.file_format, self.seq)
+
+    def close(self, wait=False):
+        """Compact and stop journaling, e.g. before loading another project or on a clean exit"""
+        if not self.project_filename:
+            return
+        self.compact()
+        # Entries not compacted because a save was running stay for recovery
+        self.writer.submit(self._remove, journal_path(self.project_filename), self.compacted_seq)
+        self.project_filename = None
+        self.compact_timer.stop()
+        if wait:
+            self.writer.wait()
+
+    def discard(self):
+        """Stop journaling and delete the journal without touching the project file"""
+        self.flush_timer.stop()
+        self.compact_timer.stop()
+        self.pending.clear()
+        self.pending_state.clear()
+        if self.project_filename:
+            self.writer.submit(self._remove, journal_path(self.project_filename), None)
+        self.project_filename = None
+
+    def replay(self, entries):
+        """Re-apply recovered journal entries to the canvas, then compact them"""
+        self.replaying = True
+        try:
+            for entry in entries:
+                self.apply(entry)
+            self.canvas.renumber_nodes()
+        finally:
+            self.replaying = False
+        self.compacted_seq = -1  # Force the recovered state into the project file
+        self.compact()
+
+    def apply(self, entry):
+        canvas = self.canvas
+        op = entry.get('op')
+        node = canvas.nodes.get(entry.get('id'))
+        if op == 'create' and node is None:
+            data = entry['node']
+            node = canvas.add_node(data['title'], data['text'], entry['id'])
+            node.setPos(data['pos_x'], data['pos_y'])
+            node.width = data['width']
+            node.height = data['height']
+            node.order_number = data['order_number']
+            node.set_color(data.get('color', 'Yellow'))
+        elif op == 'move' and node:
+            node.setPos(entry['x'], entry['y'])
+        elif op == 'resize' and node:
+            node.prepareGeometryChange()
+            node.width = entry['width']
+            node.height = entry['height']
+            node.update_connections()
+        elif op == 'text' and node:
+            node.title = entry['title']
+            node.text = entry['text']
+            node.update()
+            # Lets the duplicate index see the new text; replayed edits aren't journaled again
+            node.notify_changed('text')
+        elif op == 'color' and node:
+            node.set_color(entry['color'])
+        elif op == 'delete' and node:
+            canvas.delete_nodes([node])
+        elif op == 'clear':
+            canvas.clear_all_nodes()
+        elif op in ('connect', 'disconnect'):
+            start_node = canvas.nodes.get(entry['start'])
+            end_node = canvas.nodes.get(entry['end'])
+            if not (start_node and end_node):
+                return
+            if op == 'connect':
+                canvas.create_connection(start_node, end_node)
+            else:
+                for conn in canvas.connections_from(start_node):
+                    if conn.end_node is end_node:
+                        canvas.remove_connection(conn)
+                        break
+
+    # Worker thread jobs
+
+    def _append(self, path, entries):
+        lines = ''.join(json.dumps(entry, separators=(',', ':')) + '\n' for entry in entries)
+        with open(path, 'a', encoding='utf-8') as file:
+            file.write(lines)
+            file.flush()
+            os.fsync(file.fileno())
+
+    def _compact(self, project_filename, project_data, file_format, seq):
+        try:
+            project_file.write(project_filename, project_data, file_format)
+        except Exception as e:
+            print(f"Autosave error: {e}")
+            self.compacted.emit(False)
+            return
+        # Keep only entries written after the snapshot
+        path = journal_path(project_filename)
+        remaining = read_entries(path, seq)
+        if remaining:
+            temp_path = path + '.tmp'
+            with open(temp_path, 'w', encoding='utf-8') as file:
+                file.writelines(json.dumps(entry, separators=(',', ':')) + '\n' for entry in remaining)
+            os.replace(temp_path, path)
+        elif os.path.exists(path):
+            os.remove(path)
+        self.compacted.emit(True)
+
+    def _remove(self, path, seq):
+        # Only remove a journal that has nothing newer than the given sequence number
+        if seq is not None and read_entries(path, seq):
+            return
+        if os.path.exists(path):
+            os.remove(path)
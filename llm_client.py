@@ -0,0 +1,350 @@
+"""Streaming requests to the local Ollama and LM Studio servers.
+
+Requests run on worker threads and report back through Qt signals, so the GUI
+thread never blocks on the network.
+"""
+from PySide6.QtCore import *
+import re
+import threading
+import time
+import requests
+from stream_parser import NDJSONParser, SSEParser, StreamFormatError, decode_json, ollama_stats, openai_stats
+
+# Default network timeouts in seconds: connecting, and waiting between streamed chunks
+# (the wait before the first token includes prompt processing, so it is generous)
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 300
+MODEL_LIST_TIMEOUT = 10
+
+# Ollama allocates memory for the whole context it is asked for, so a model's
+# maximum context is only used up to this length unless the Modelfile sets num_ctx
+OLLAMA_MAX_CONTEXT = 8192
+
+# Texts sent per embedding request
+EMBED_BATCH_SIZE = 64
+
+# How long Ollama keeps a model, and its cached conversation prefix, loaded between requests
+KEEP_ALIVE = '30m'
+
+SYSTEM_PROMPT = "You are a helpful assistant."
+
+# Sampling parameters sent with each request (servers use their defaults otherwise)
+SAMPLING_PARAMETERS = {
+    "Ollama": {},
+    "LM Studio": {'temperature': 0.7},
+}
+
+# One keep-alive session per server endpoint, shared by all requests, with
+# enough pooled connections for concurrent path requests
+POOL_SIZE = 16
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def get_session(base_url):
+    """Return the shared HTTP session for a server endpoint"""
+    with _sessions_lock:
+        session = _sessions.get(base_url)
+        if session is None:
+            session = _sessions[base_url] = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_maxsize=POOL_SIZE)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+        return session
+
+
+def list_models(server, base_url, timeout=(CONNECT_TIMEOUT, MODEL_LIST_TIMEOUT)):
+    """Return the models a server offers, as dicts with the name and whatever else it reports.
+
+    Other keys, when known: size (bytes), parameter_size, quantization,
+    context_length, loaded (whether the model is in memory) and type.
+    """
+    session = get_session(base_url)
+    if server == "Ollama":
+        response = session.get(f'{base_url}/api/tags', timeout=timeout)
+        response.raise_for_status()
+        # Running models, with the context length they were loaded with
+        running = {}
+        ps_response = session.get(f'{base_url}/api/ps', timeout=timeout)
+        if ps_response.ok:
+            running = {model['name']: model for model in ps_response.json().get('models') or []}
+        models = []
+        for model in response.json()['models']:
+            details = model.get('details') or {}
+            info = {'name': model['name'], 'size': model.get('size'),
+                    'parameter_size': details.get('parameter_size'),
+                    'quantization': details.get('quantization_level'),
+                    'loaded': model['name'] in running}
+            if running.get(model['name'], {}).get('context_length'):
+                info['context_length'] = running[model['name']]['context_length']
+            models.append(info)
+        return models
+    if server == "LM Studio":
+        # The REST API describes the models; older versions only have the OpenAI list
+        response = session.get(f'{base_url}/api/v0/models', timeout=timeout)
+        if response.status_code == 404:
+            response = session.get(f'{base_url}/v1/models', timeout=timeout)
+            response.raise_for_status()
+            return [{'name': model['id']} for model in response.json()['data']]
+        response.raise_for_status()
+        models = []
+        for model in response.json()['data']:
+            info = {'name': model['id'], 'type': model.get('type'), 'quantization': model.get('quantization'),
+                    'loaded': model.get('state') == 'loaded'}
+            length = model.get('loaded_context_length') or model.get('max_context_length')
+            if length:
+                info['context_length'] = int(length)
+            models.append(info)
+        return models
+    raise ValueError(f"Unknown server {server}")
+
+
+def embed(server, base_url, model, texts, batch_size=EMBED_BATCH_SIZE,
+          timeout=(CONNECT_TIMEOUT, READ_TIMEOUT)):
+    """Return one embedding vector per text from the server's embedding endpoint"""
+    session = get_session(base_url)
+    vectors = []
+    for start in range(0, len(texts), batch_size):
+        batch = texts[start:start + batch_size]
+        if server == "Ollama":
+            response = session.post(f'{base_url}/api/embed', json={'model': model, 'input': batch},
+                                    timeout=timeout)
+            response.raise_for_status()
+            vectors.extend(response.json()['embeddings'])
+        elif server == "LM Studio":
+            response = session.post(f'{base_url}/v1/embeddings', json={'model': model, 'input': batch},
+                                    timeout=timeout)
+            response.raise_for_status()
+            data = sorted(response.json()['data'], key=lambda item: item['index'])
+            vectors.extend(item['embedding'] for item in data)
+        else:
+            raise ValueError(f"Unknown server {server}")
+    return vectors
+
+
+def get_context_length(server, base_url, model, timeout=(CONNECT_TIMEOUT, MODEL_LIST_TIMEOUT)):
+    """Return the context length a model runs with, or None if the server doesn't say"""
+    session = get_session(base_url)
+    if server == "Ollama":
+        response = session.post(f'{base_url}/api/show', json={'model': model}, timeout=timeout)
+        response.raise_for_status()
+        info = response.json()
+        # A num_ctx set in the Modelfile is what Ollama uses; otherwise the model's maximum
+        match = re.search(r'^num_ctx\s+(\d+)', info.get('parameters') or '', re.MULTILINE)
+        if match:
+            return int(match.group(1))
+        for key, value in (info.get('model_info') or {}).items():
+            if key.endswith('.context_length'):
+                return min(int(value), OLLAMA_MAX_CONTEXT)
+        return None
+    if server == "LM Studio":
+        response = session.get(f'{base_url}/api/v0/models/{model}', timeout=timeout)
+        response.raise_for_status()
+        info = response.json()
+        length = info.get('loaded_context_length') or info.get('max_context_length')
+        return int(length) if length else None
+    raise ValueError(f"Unknown server {server}")
+
+
+def conversation_start(prompt):
+    """Chat messages for the first question of a conversation"""
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
+
+
+class StreamRequest(QObject):
+    """Stream a completion from Ollama or LM Studio on a worker thread.
+
+    Either a single prompt or a list of chat messages is sent. Emits
+    token(text) for each piece of the answer (all text that arrived in one
+    network chunk at once), stats(dict) with token counts and timings when the
+    answer is complete, error(message) on failure and always finished() last.
+    stop() aborts the HTTP stream.
+    """
+    token = Signal(str)
+    stats = Signal(dict)
+    error = Signal(str)
+    finished = Signal()
+
+    def __init__(self, server, base_url, model, prompt, options=None, messages=None,
+                 connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT):
+        super().__init__()
+        self.server = server
+        self.base_url = base_url
+        self.model = model
+        self.prompt = prompt
+        self.messages = messages  # Conversation to continue instead of a single prompt
+        self.options = options or {}  # Extra Ollama options, e.g. num_ctx
+        self.timeout = (connect_timeout, read_timeout)
+        self.stopped = False
+        self.response = None
+        self.lock = threading.Lock()
+        self.start_time = None
+        self.first_token_time = None
+        self.deltas = 0  # Content pieces received, about one per token
+        self.usage = {}  # Token counts reported by LM Studio
+
+    def start(self):
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def stop(self):
+        """Abort the request; closing the response interrupts a blocked read"""
+        with self.lock:
+            self.stopped = True
+            response = self.response
+        if response is not None:
+            response.close()
+
+    def run(self):
+        self.start_time = time.perf_counter()
+        try:
+            if self.server == "Ollama" and self.messages:
+                self.stream_ollama_chat()
+            elif self.server == "Ollama":
+                self.stream_ollama()
+            elif self.server == "LM Studio":
+                self.stream_lm_studio()
+            else:
+                self.error.emit(f"Unknown server {self.server}")
+        except requests.exceptions.Timeout:
+            if not self.stopped:
+                self.error.emit(f"{self.server} did not respond in time")
+        except StreamFormatError as e:
+            if not self.stopped:
+                self.error.emit(f"Unexpected response from {self.server} - {str(e)}")
+        except Exception as e:
+            if not self.stopped:
+                self.error.emit(f"Could not connect to {self.server} - {str(e)}")
+        finally:
+            with self.lock:
+                response, self.response = self.response, None
+            if response is not None:
+                response.close()
+            self.finished.emit()
+
+    def open_stream(self, url, **kwargs):
+        response = get_session(self.base_url).post(url, stream=True, timeout=self.timeout, **kwargs)
+        with self.lock:
+            if self.stopped:
+                response.close()
+                return None
+            self.response = response
+        return response
+
+    def read_stream(self, response, parser, handle):
+        """Parse the response body chunk by chunk as it arrives.
+
+        handle(item) is called for each parsed line or event and returns
+        (text, done); reading stops once an item completes the answer.
+        """
+        for chunk in response.iter_content(chunk_size=None):
+            if self.stopped:
+                return
+            if self.handle_items(parser.feed(chunk), handle):
+                return
+        if not self.stopped:
+            self.handle_items(parser.close(), handle)
+
+    def handle_items(self, items, handle):
+        texts = []
+        done = False
+        for item in items:
+            text, done = handle(item)
+            if text:
+                if self.first_token_time is None:
+                    self.first_token_time = time.perf_counter()
+                texts.append(text)
+            if done:
+                break
+        if texts:
+            self.token.emit("".join(texts))
+        return done
+
+    def emit_stats(self, stats):
+        """Add the timings seen by the client to the server's statistics and emit them"""
+        if self.first_token_time is not None:
+            stats['first_token_seconds'] = self.first_token_time - self.start_time
+            seconds = time.perf_counter() - self.first_token_time
+            if 'tokens_per_second' not in stats and stats.get('tokens') and seconds > 0:
+                stats['tokens_per_second'] = stats['tokens'] / seconds
+        self.stats.emit(stats)
+
+    def handle_ollama(self, item):
+        if 'error' in item:
+            self.error.emit(str(item['error']))
+            return "", True
+        # /api/generate streams "response", /api/chat streams "message"
+        text = item.get('response') or (item.get('message') or {}).get('content') or ""
+        if item.get('done'):
+            self.emit_stats(ollama_stats(item))
+            return text, True
+        return text, False
+
+    def handle_lm_studio(self, event):
+        kind, data = event
+        if kind == 'error':
+            self.error.emit(data)
+            return "", True
+        if data == '[DONE]':
+            self.emit_stats(self.usage or {'tokens': self.deltas})
+            return "", True
+        item = decode_json(data)
+        if 'error' in item:
+            error = item['error']
+            self.error.emit(str(error.get('message', error) if isinstance(error, dict) else error))
+            return "", True
+        if item.get('usage'):
+            self.usage = openai_stats(item)
+        choices = item.get('choices')
+        content = (choices[0].get('delta') or {}).get('content') if choices else None
+        if content:
+            self.deltas += 1
+            return content, False
+        return "", False
+
+    def stream_ollama(self):
+        response = self.open_stream(
+            f'{self.base_url}/api/generate',
+            json={
+                'model': self.model,
+                'prompt': self.prompt,
+                'stream': True,
+                'options': {**SAMPLING_PARAMETERS["Ollama"], **self.options}
+            }
+        )
+        if response is not None:
+            self.read_stream(response, NDJSONParser(), self.handle_ollama)
+
+    def stream_ollama_chat(self):
+        # Ollama reuses the evaluated prefix of a conversation the model still has loaded
+        response = self.open_stream(
+            f'{self.base_url}/api/chat',
+            json={
+                'model': self.model,
+                'messages': self.messages,
+                'stream': True,
+                'keep_alive': KEEP_ALIVE,
+                'options': {**SAMPLING_PARAMETERS["Ollama"], **self.options}
+            }
+        )
+        if response is not None:
+            self.read_stream(response, NDJSONParser(), self.handle_ollama)
+
+    def stream_lm_studio(self):
+        response = self.open_stream(
+            f'{self.base_url}/v1/chat/completions',
+            json={
+                'model': self.model,
+                # An unchanged message prefix lets LM Studio reuse its prompt cache
+                'messages': self.messages or conversation_start(self.prompt),
+                'stream': True,
+                # Ask for token counts in a final chunk
+                'stream_options': {'include_usage': True},
+                **SAMPLING_PARAMETERS["LM Studio"]
+            },
+            headers={"Content-Type": "application/json"}
+        )
+        if response is not None:
+            self.read_stream(response, SSEParser(), self.handle_lm_studio)
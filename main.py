@@ -5,6 +5,9 @@ import sys
 from node_canvas import NodeCanvas
 from text_viewer import TextViewer
 from chat_panel import ChatPanel
+from journal import ProjectJournal, journal_path
+import project_file
+import os
 
 class MainWindow(QMainWindow):
     def __init__(self):
@@ -59,6 +62,8 @@ class MainWindow(QMainWindow):
         
         # Create node canvas
         self.canvas = NodeCanvas()
+        # Viewport repaint strategy: 'smart' (default), 'minimal', 'bounding' or 'full'
+        self.canvas.set_viewport_update_mode(self.settings.value('viewport_update_mode', 'smart'))
         self.content_splitter.addWidget(self.canvas)
         
         # Create text viewer
@@ -67,6 +72,20 @@ class MainWindow(QMainWindow):
         
         # Connect node selection signal to text viewer
         self.canvas.node_selected.connect(self.text_viewer.display_node)
+
+        # Autosave journal for crash recovery
+        self.journal = ProjectJournal(self.canvas)
+        self.journal.compacted.connect(
+            lambda success: self.statusBar().showMessage("Autosaved" if success else "Autosave failed", 3000))
+        self.loading_filename = None
+        self.saving_filename = None
+
+        # Report background load/save progress
+        self.load_progress_dialog = None
+        self.save_progress_dialog = None
+        self.canvas.load_progress.connect(self.update_load_progress)
+        self.canvas.load_finished.connect(self.project_loaded)
+        self.canvas.save_finished.connect(self.project_saved)
         # REMOVE connection to chat panel from here
         # self.canvas.node_selected.connect(self.chat_panel.sync_color_selector_to_node)
 
@@ -113,21 +132,105 @@ class MainWindow(QMainWindow):
         status_bar.addPermanentWidget(credits_label)
         status_bar.setStyleSheet("QStatusBar::item {border: none;}")
 
+        # A project still registered as journaled means the last session did not exit cleanly
+        journaled_project = self.settings.value('journal_project')
+        if journaled_project and os.path.exists(journal_path(journaled_project)):
+            QTimer.singleShot(0, lambda: self.open_project(journaled_project))
+
     def save_project(self):
-        filename, _ = QFileDialog.getSaveFileName(self, "Save Project", "", "Dou (*.dou)")
+        # Offer each file format as a filter, preselecting the one the project was loaded with
+        labels = project_file.FORMAT_LABELS
+        filename, selected_filter = QFileDialog.getSaveFileName(
+            self, "Save Project", "", ";;".join(labels.values()),
+            labels.get(self.canvas.file_format, labels[project_file.DEFAULT_FORMAT])
+        )
         if filename:
-            # Canvas now handles saving its own background color
-            self.canvas.save_to_file(filename)
+            if not filename.lower().endswith('.dou'):
+                filename += '.dou'
+            file_format = next((name for name, label in labels.items() if label == selected_filter),
+                               self.canvas.file_format)
+            if self.canvas.is_loading():
+                QMessageBox.warning(self, "Save Project", "Please wait for the project to finish loading.")
+                return
+            # Include edits the text viewer hasn't written to the node yet
+            self.text_viewer.flush()
+            # Canvas now handles saving its own background color; encoding and writing run in the background
+            self.statusBar().showMessage(f"Saving {filename}...")
+            self.journal.prepare_save()
+            self.saving_filename = filename
+            # Large projects take a while to encode; the save can be cancelled until the file is replaced
+            self.save_progress_dialog = QProgressDialog("Saving project...", "Cancel", 0, 0, self)
+            self.save_progress_dialog.setWindowModality(Qt.NonModal)
+            self.save_progress_dialog.setMinimumDuration(500)
+            self.save_progress_dialog.canceled.connect(self.canvas.cancel_save)
+            self.canvas.save_to_file_async(filename, file_format)
             
     def load_project(self):
         filename, _ = QFileDialog.getOpenFileName(self, "Load Project", "", "Dou (*.dou)")
         if filename:
-            # Canvas now handles loading its own background color
-            self.canvas.load_from_file(filename)
+            self.open_project(filename)
+
+    def open_project(self, filename):
+        # End a load still running first; its load_finished(False) must not reach the new load's state
+        self.canvas.cancel_load()
+        # Autosave the current project before replacing it
+        self.journal.close()
+        self.loading_filename = filename
+        # Canvas now handles loading its own background color; reading and parsing run in the background
+        self.statusBar().showMessage(f"Loading {filename}...")
+        self.load_progress_dialog = QProgressDialog("Loading project...", "Cancel", 0, 0, self)
+        self.load_progress_dialog.setWindowModality(Qt.NonModal)  # Canvas stays usable while loading
+        self.load_progress_dialog.setMinimumDuration(500)
+        self.load_progress_dialog.canceled.connect(self.canvas.cancel_load)
+        self.canvas.load_from_file_async(filename)
+
+    def update_load_progress(self, done, total):
+        if self.load_progress_dialog:
+            self.load_progress_dialog.setMaximum(total)
+            self.load_progress_dialog.setValue(done)
+
+    def project_loaded(self, success):
+        if self.load_progress_dialog:
+            self.load_progress_dialog.canceled.disconnect(self.canvas.cancel_load)
+            self.load_progress_dialog.close()
+            self.load_progress_dialog = None
+        self.statusBar().showMessage("Project loaded" if success else "Project not loaded", 3000)
+        if success and self.loading_filename:
+            self.chat_panel.set_project_file(self.loading_filename)
+            self.start_journal(self.loading_filename)
+        self.loading_filename = None
+
+    def project_saved(self, success):
+        if self.save_progress_dialog:
+            self.save_progress_dialog.canceled.disconnect(self.canvas.cancel_save)
+            self.save_progress_dialog.close()
+            self.save_progress_dialog = None
+        self.statusBar().showMessage("Project saved" if success else "Project not saved", 3000)
+        if success and self.saving_filename:
+            self.journal.saved(self.saving_filename)
+            self.chat_panel.project_saved(self.saving_filename)
+            self.settings.setValue('journal_project', self.saving_filename)
+        self.saving_filename = None
+
+    def start_journal(self, filename):
+        """Start journaling a loaded project, offering to recover edits from an unclean exit"""
+        recovered = self.journal.open(filename)
+        self.settings.setValue('journal_project', filename)
+        if recovered:
+            reply = QMessageBox.question(
+                self, "Recover Changes",
+                f"{len(recovered)} unsaved changes to this project were found from a previous session. "
+                "Do you want to recover them?",
+                QMessageBox.Yes | QMessageBox.No, QMessageBox.Yes)
+            if reply == QMessageBox.Yes:
+                self.journal.replay(recovered)
+            else:
+                self.journal.discard_recovered()
             
     def export_markdown(self):
         filename, _ = QFileDialog.getSaveFileName(self, "Export to Markdown", "", "Markdown (*.md)")
         if filename:
+            self.text_viewer.flush()
             with open(filename, 'w') as f:
                 nodes = []
                 visited = set()
@@ -137,19 +240,16 @@ class MainWindow(QMainWindow):
                         return
                     visited.add(node)
                     nodes.append(node)
-                    for conn in self.canvas.connections:
-                        if conn.start_node == node:
-                            traverse_nodes(conn.end_node)
+                    for conn in self.canvas.connections_from(node):
+                        traverse_nodes(conn.end_node)
                 
                 # Find root nodes (nodes with no incoming connections)
-                root_nodes = set(self.canvas.scene.items())
-                for conn in self.canvas.connections:
-                    root_nodes.discard(conn.end_node)
+                root_nodes = [node for node in self.canvas.nodes.values()
+                              if not self.canvas.connections_to(node)]
                     
                 # Traverse from each root node
                 for root in root_nodes:
-                    if isinstance(root, TextNode):
-                        traverse_nodes(root)
+                    traverse_nodes(root)
                 
                 # Write nodes to markdown
                 for node in nodes:
@@ -193,6 +293,7 @@ class MainWindow(QMainWindow):
         )
         
         if filename:
+            self.text_viewer.flush()
             try:
                 with open(filename, 'w', encoding='utf-8') as f:
                     f.write(self.canvas.selected_node.text)
@@ -225,6 +326,14 @@ class MainWindow(QMainWindow):
         # Save splitter states
         self.settings.setValue('content_splitter_state', self.content_splitter.saveState())
         self.settings.setValue('vertical_splitter_state', self.vertical_splitter.saveState())
+
+        # Write pending edits into the project and mark the exit as clean
+        self.text_viewer.flush()
+        while self.canvas.save_task:
+            # Let a running save finish first, so the final autosave doesn't write the file at the same time
+            QApplication.processEvents(QEventLoop.AllEvents, 50)
+        self.journal.close(wait=True)
+        self.settings.remove('journal_project')
         
         # Ensure settings are saved
         self.settings.sync()
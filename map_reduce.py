@@ -0,0 +1,93 @@
+"""Map-reduce analysis of many paths.
+
+Each path is asked the question in its own request, several at a time, and the
+per-path answers are then combined by one final request.
+"""
+from PySide6.QtCore import *
+from llm_client import StreamRequest
+
+# Default number of path requests in flight at once
+DEFAULT_CONCURRENCY = 4
+
+MAP_PROMPT = """Here is the text from one path of nodes:
+
+{path_text}
+
+User question: {question}
+
+Answer the question using only the text of this path. Be concise; your answer will be combined with the answers for other paths."""
+
+REDUCE_PROMPT = """The user asked a question about several paths of nodes. Here are the answers for each path:
+
+{answers}
+
+User question: {question}
+
+Combine these answers into one complete answer to the question. You can use markdown formatting in your response."""
+
+
+class MapRequest(QObject):
+    """Stream one request per prompt, at most `concurrency` at a time.
+
+    Emits path_finished(index, answer, error) as each request completes, with
+    an empty error on success, and finished() once all of them are done.
+    """
+    path_finished = Signal(int, str, str)
+    finished = Signal()
+
+    def __init__(self, server, base_url, model, prompts, options=None, concurrency=DEFAULT_CONCURRENCY):
+        super().__init__()
+        self.server = server
+        self.base_url = base_url
+        self.model = model
+        self.prompts = prompts
+        self.options = options
+        self.concurrency = max(1, concurrency)
+        self.answers = [""] * len(prompts)
+        self.errors = [""] * len(prompts)
+        self.running = {}  # index -> StreamRequest
+        self.next_index = 0
+        self.done = 0
+        self.stopped = False
+
+    def start(self):
+        if not self.prompts:
+            self.finished.emit()
+            return
+        while len(self.running) < self.concurrency and self.next_index < len(self.prompts):
+            self.start_next()
+
+    def start_next(self):
+        index = self.next_index
+        self.next_index += 1
+        request = StreamRequest(self.server, self.base_url, self.model, self.prompts[index], self.options)
+        request.index = index
+        request.token.connect(self.on_token)
+        request.error.connect(self.on_error)
+        request.finished.connect(self.on_finished)
+        self.running[index] = request
+        request.start()
+
+    def stop(self):
+        """Stop the running requests and don't start the remaining ones"""
+        self.stopped = True
+        self.next_index = len(self.prompts)
+        for request in list(self.running.values()):
+            request.stop()
+
+    def on_token(self, token):
+        self.answers[self.sender().index] += token
+
+    def on_error(self, message):
+        self.errors[self.sender().index] = message
+
+    def on_finished(self):
+        index = self.sender().index
+        del self.running[index]
+        self.done += 1
+        if not self.stopped:
+            self.path_finished.emit(index, self.answers[index], self.errors[index])
+        if self.next_index < len(self.prompts):
+            self.start_next()
+        elif not self.running:
+            self.finished.emit()
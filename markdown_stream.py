@@ -0,0 +1,139 @@
+"""Incremental markdown rendering of streamed chat responses.
+
+The response is split into markdown blocks as it arrives. Finished blocks are
+converted and inserted once; only the trailing open block is re-rendered, and
+display updates are coalesced to a fixed frame rate.
+"""
+from PySide6.QtCore import *
+from PySide6.QtGui import QTextCursor, QTextBlockFormat, QTextCharFormat
+import re
+import markdown
+
+MARKDOWN_EXTENSIONS = ['fenced_code', 'tables', 'nl2br']
+
+# Lines that continue a list rather than start a new block after a blank line
+LIST_ITEM_RE = re.compile(r'^\s*([*+-]|\d+[.)])\s')
+FENCE_RE = re.compile(r'^\s*(```|~~~)')
+
+
+class MarkdownBlockSplitter:
+    """Finds where finished markdown blocks end in a growing text.
+
+    Only complete lines are examined. A block is finished once a blank line is
+    followed by a complete line that does not continue it (not indented, not a
+    list item), outside fenced code.
+    """
+
+    def __init__(self):
+        self.scan_position = 0  # Start of the first line not yet examined
+        self.committed = 0  # End of the text already handed out as finished blocks
+        self.in_fence = False
+        self.after_blank = False
+
+    def feed(self, text):
+        """Return the finished blocks in text that were not returned before"""
+        blocks = []
+        while True:
+            newline = text.find('\n', self.scan_position)
+            if newline == -1:
+                break
+            line = text[self.scan_position:newline]
+            line_start = self.scan_position
+            self.scan_position = newline + 1
+
+            if self.in_fence:
+                if FENCE_RE.match(line):
+                    self.in_fence = False
+                continue
+            if not line.strip():
+                self.after_blank = True
+                continue
+            if self.after_blank and not line[0].isspace() and not LIST_ITEM_RE.match(line):
+                if line_start > self.committed:
+                    blocks.append(text[self.committed:line_start])
+                    self.committed = line_start
+            self.after_blank = False
+            if FENCE_RE.match(line):
+                self.in_fence = True
+        return blocks
+
+
+class StreamingMarkdownRenderer(QObject):
+    """Render a streamed markdown response into a QTextBrowser from a document position.
+
+    The rendered text is kept between two cursors that follow edits elsewhere
+    in the document, so several responses can stream at once and messages can
+    be added after one while it streams.
+    """
+
+    def __init__(self, display, position, clean=None, frame_rate=30):
+        super().__init__()
+        self.display = display
+        # Start of the open trailing block and end of the rendered text; text
+        # inserted right at them by others goes before and after the response
+        self.tail = QTextCursor(display.document())
+        self.tail.setPosition(position)
+        self.tail.setKeepPositionOnInsert(True)
+        self.end = QTextCursor(self.tail)
+        self.end.setKeepPositionOnInsert(True)
+        self.clean = clean  # Optional cleanup applied to the trailing block
+        self.text = ""
+        self.has_blocks = False  # Whether any finished block was inserted yet
+        self.splitter = MarkdownBlockSplitter()
+        self.markdown = markdown.Markdown(extensions=MARKDOWN_EXTENSIONS)
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(int(1000 / frame_rate))
+        self.timer.timeout.connect(self.render)
+
+    def append(self, token):
+        """Add streamed text; the display is updated at most once per frame"""
+        self.text += token
+        if not self.timer.isActive():
+            self.timer.start()
+
+    def finish(self):
+        """Render everything received so far and stop updating"""
+        self.timer.stop()
+        self.render()
+
+    def to_html(self, text):
+        html = self.markdown.reset().convert(text)
+        # Explicitly close any open lists with a non-list element
+        if html.endswith("</li></ul>") or html.endswith("</li></ol>"):
+            html += "<div></div>"
+        return html
+
+    def insert_fragment(self, cursor, html):
+        if self.has_blocks:
+            # Start a fresh paragraph so the fragment does not merge into the previous one
+            cursor.insertBlock(QTextBlockFormat(), QTextCharFormat())
+        cursor.insertHtml(html)
+
+    def render(self):
+        # Follow the response only if the user has not scrolled away from the end
+        scroll_bar = self.display.verticalScrollBar()
+        at_end = scroll_bar.value() >= scroll_bar.maximum()
+
+        # Remove the previously rendered trailing block
+        cursor = QTextCursor(self.display.document())
+        cursor.setPosition(self.tail.position())
+        cursor.setPosition(self.end.position(), QTextCursor.KeepAnchor)
+        cursor.removeSelectedText()
+
+        # Insert newly finished blocks once
+        for block in self.splitter.feed(self.text):
+            self.insert_fragment(cursor, self.to_html(block))
+            self.has_blocks = True
+        self.tail.setPosition(cursor.position())
+
+        # Re-render only the open trailing block
+        tail = self.text[self.splitter.committed:]
+        if self.clean:
+            tail = self.clean(tail)
+        if tail.strip():
+            self.insert_fragment(cursor, self.to_html(tail))
+        self.end.setPosition(cursor.position())
+
+        if at_end:
+            scroll_bar.setValue(scroll_bar.maximum())
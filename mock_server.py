@@ -0,0 +1,194 @@
+"""Local stand-in for the Ollama and LM Studio servers.
+
+Speaks enough of both protocols for Dou to list models, stream answers,
+report context lengths and embed text, so the chat panel can be tried and
+benchmarked without a real install. Token rate, first-token latency and error
+injection are configurable.
+
+Run with: python mock_server.py [--port 11434] [--rate 50] [--latency 0.2]
+"""
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import argparse
+import json
+import random
+import threading
+import time
+
+MODEL_NAME = "mock-model"
+CONTEXT_LENGTH = 8192
+EMBEDDING_SIZE = 64
+
+# Markdown answer repeated to build long responses
+ANSWER_WORDS = (
+    "## Summary\n\nThe selected **nodes** describe a path with several steps.\n\n"
+    "- First point about the notes\n- Second point with `code`\n\n"
+    "```python\nprint('hello')\n```\n\n"
+    "1. A numbered item\n2. Another item\n\nClosing paragraph with more text. "
+).split(" ")
+
+
+class MockSettings:
+    """Behaviour of the mock server, shared by all requests"""
+
+    def __init__(self, tokens=200, rate=50.0, latency=0.2, error_rate=0.0, stream_error_rate=0.0):
+        self.tokens = tokens  # Tokens per answer
+        self.rate = rate  # Tokens per second, 0 for as fast as possible
+        self.latency = latency  # Seconds before the first token
+        self.error_rate = error_rate  # Share of requests answered with HTTP 500
+        self.stream_error_rate = stream_error_rate  # Share of streams that fail halfway
+
+
+def answer_tokens(count):
+    return [ANSWER_WORDS[i % len(ANSWER_WORDS)] + " " for i in range(count)]
+
+
+def embedding(text):
+    """Deterministic bag-of-words vector, so similar texts get similar vectors"""
+    vector = [0.0] * EMBEDDING_SIZE
+    for word in text.lower().split():
+        vector[sum(map(ord, word)) % EMBEDDING_SIZE] += 1.0
+    return vector
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    settings = MockSettings()
+
+    def log_message(self, format, *args):
+        pass  # Keep benchmark output clean
+
+    def handle(self):
+        try:
+            super().handle()
+        except ConnectionResetError:
+            pass  # Client closed a kept-alive connection
+
+    def send_json(self, data, status=200):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_json(self):
+        length = int(self.headers.get('Content-Length', 0))
+        return json.loads(self.rfile.read(length) or b'{}')
+
+    def do_GET(self):
+        if self.path == '/api/tags':
+            self.send_json({'models': [{'name': MODEL_NAME, 'size': 4 * 10 ** 9,
+                                        'details': {'parameter_size': '7B', 'quantization_level': 'Q4_K_M'}}]})
+        elif self.path == '/api/ps':
+            self.send_json({'models': [{'name': MODEL_NAME, 'context_length': CONTEXT_LENGTH}]})
+        elif self.path == '/v1/models':
+            self.send_json({'data': [{'id': MODEL_NAME}]})
+        elif self.path == '/api/v0/models':
+            self.send_json({'data': [{'id': MODEL_NAME, 'type': 'llm', 'quantization': 'Q4_K_M', 'state': 'loaded',
+                                      'max_context_length': CONTEXT_LENGTH}]})
+        elif self.path.startswith('/api/v0/models/'):
+            self.send_json({'id': self.path.rsplit('/', 1)[-1], 'loaded_context_length': CONTEXT_LENGTH})
+        else:
+            self.send_json({'error': 'not found'}, 404)
+
+    def do_POST(self):
+        request = self.read_json()
+        if self.path == '/api/show':
+            self.send_json({'parameters': f'num_ctx {CONTEXT_LENGTH}', 'model_info': {}})
+        elif self.path == '/api/embed':
+            self.send_json({'embeddings': [embedding(text) for text in request.get('input', [])]})
+        elif self.path == '/v1/embeddings':
+            self.send_json({'data': [{'index': i, 'embedding': embedding(text)}
+                                     for i, text in enumerate(request.get('input', []))]})
+        elif self.path in ('/api/generate', '/api/chat', '/v1/chat/completions'):
+            self.stream_answer()
+        else:
+            self.send_json({'error': 'not found'}, 404)
+
+    def stream_answer(self):
+        settings = self.settings
+        if random.random() < settings.error_rate:
+            self.send_json({'error': 'mock server error'}, 500)
+            return
+        time.sleep(settings.latency)
+
+        self.send_response(200)
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        fail_at = settings.tokens // 2 if random.random() < settings.stream_error_rate else None
+        interval = 1 / settings.rate if settings.rate else 0
+        start = time.perf_counter()
+        try:
+            if self.path == '/v1/chat/completions':
+                self.write_chunk(b": keep-alive\n\n")
+            for i, token in enumerate(answer_tokens(settings.tokens)):
+                if i == fail_at:
+                    self.write_chunk(self.error_line("mock stream error"))
+                    break
+                self.write_chunk(self.token_line(token))
+                # Pace by schedule rather than per-token sleeps so the rate holds
+                delay = start + (i + 1) * interval - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            else:
+                self.write_chunk(self.done_line(time.perf_counter() - start))
+            self.wfile.write(b'0\r\n\r\n')
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # Client stopped the stream
+
+    def write_chunk(self, data):
+        self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+        self.wfile.flush()
+
+    def token_line(self, token):
+        if self.path == '/v1/chat/completions':
+            data = {'choices': [{'delta': {'content': token}}]}
+            return f"data: {json.dumps(data)}\n\n".encode('utf-8')
+        if self.path == '/api/chat':
+            data = {'message': {'role': 'assistant', 'content': token}, 'done': False}
+        else:
+            data = {'response': token, 'done': False}
+        return (json.dumps(data) + '\n').encode('utf-8')
+
+    def error_line(self, message):
+        if self.path == '/v1/chat/completions':
+            return f"data: {json.dumps({'error': message})}\n\n".encode('utf-8')
+        return (json.dumps({'error': message}) + '\n').encode('utf-8')
+
+    def done_line(self, seconds):
+        """Final message with token counts; Ollama also reports durations in nanoseconds"""
+        tokens = self.settings.tokens
+        if self.path == '/v1/chat/completions':
+            usage = {'prompt_tokens': 100, 'completion_tokens': tokens, 'total_tokens': 100 + tokens}
+            return f"data: {json.dumps({'choices': [], 'usage': usage})}\n\ndata: [DONE]\n\n".encode('utf-8')
+        data = {'done': True, 'prompt_eval_count': 100, 'prompt_eval_duration': 10 ** 8,
+                'eval_count': tokens, 'eval_duration': max(int(seconds * 1e9), 1),
+                'total_duration': int((seconds + self.settings.latency) * 1e9)}
+        return (json.dumps(data) + '\n').encode('utf-8')
+
+
+def start_server(port=0, settings=None):
+    """Serve on a background thread; returns the server, whose port is server.server_address[1]"""
+    handler = type('Handler', (MockHandler,), {'settings': settings or MockSettings()})
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Mock Ollama and LM Studio server")
+    parser.add_argument('--port', type=int, default=11434, help="port (Ollama 11434, LM Studio 1234)")
+    parser.add_argument('--tokens', type=int, default=200, help="tokens per answer")
+    parser.add_argument('--rate', type=float, default=50.0, help="tokens per second, 0 for unlimited")
+    parser.add_argument('--latency', type=float, default=0.2, help="seconds before the first token")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="share of requests failing with HTTP 500")
+    parser.add_argument('--stream-error-rate', type=float, default=0.0, help="share of streams failing halfway")
+    args = parser.parse_args()
+    settings = MockSettings(args.tokens, args.rate, args.latency, args.error_rate, args.stream_error_rate)
+    server = start_server(args.port, settings)
+    print(f"Mock Ollama/LM Studio server on http://127.0.0.1:{server.server_address[1]}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -3,12 +3,27 @@ from PySide6.QtCore import *
 from PySide6.QtGui import *
 import json
 from text_node import TextNode
+from background import BackgroundTask
+from duplicates import DuplicateIndex
+import duplicates
+import project_file
 import math
+import uuid
 from PySide6.QtGui import QClipboard
 from PySide6.QtCore import Qt
 import json  # Add this import
 
+def is_persistent_node_id(node_id):
+    """Check whether a saved node key is a persistent UUID rather than a legacy id() key"""
+    try:
+        return isinstance(node_id, str) and uuid.UUID(node_id).hex == node_id
+    except ValueError:
+        return False
+
 class Connection(QGraphicsPathItem):
+    # View scale below which connections are drawn as thin straight lines
+    lod_line_scale = 0.4
+
     def __init__(self, start_node, end_node, edge_type):
         super().__init__()
         self.start_node = start_node
@@ -22,6 +37,7 @@ class Connection(QGraphicsPathItem):
         # Get edge points based on edge type
         start_pos = self.get_edge_point(self.start_node, self.edge_type)
         end_pos = self.get_edge_point(self.end_node, self.get_opposite_edge(self.edge_type))
+        self.line = QLineF(start_pos, end_pos)  # Used for zoomed-out drawing
         
         # Calculate control points for the Bézier curve
         dx = end_pos.x() - start_pos.x()
@@ -41,6 +57,17 @@ class Connection(QGraphicsPathItem):
         path.cubicTo(ctrl1, ctrl2, end_pos)
         self.setPath(path)
         
+    def paint(self, painter, option, widget):
+        lod = option.levelOfDetailFromTransform(painter.worldTransform())
+        if lod < self.lod_line_scale:
+            pen = QPen(self.pen().color(), 2)
+            pen.setCosmetic(True)
+            painter.setRenderHint(QPainter.Antialiasing, False)
+            painter.setPen(pen)
+            painter.drawLine(self.line)
+        else:
+            super().paint(painter, option, widget)
+        
     def get_edge_point(self, node, edge):
         if edge == "left":
             return node.pos() + QPointF(0, node.height/2)
@@ -57,8 +84,22 @@ class Connection(QGraphicsPathItem):
 
 class NodeCanvas(QGraphicsView):
     node_selected = Signal(object)
+    load_progress = Signal(int, int)  # items created, total items
+    load_finished = Signal(bool)
+    save_finished = Signal(bool)
+    # User edits: ('create' | 'move' | 'resize' | 'text' | 'color' | 'delete', node),
+    # ('connect' | 'disconnect', connection) or ('clear', None)
+    edited = Signal(str, object)
+
+    # Named viewport update modes, selectable through set_viewport_update_mode
+    VIEWPORT_UPDATE_MODES = {
+        'full': QGraphicsView.FullViewportUpdate,
+        'minimal': QGraphicsView.MinimalViewportUpdate,
+        'smart': QGraphicsView.SmartViewportUpdate,
+        'bounding': QGraphicsView.BoundingRectViewportUpdate,
+    }
 
-    def __init__(self):
+    def __init__(self, viewport_update_mode='smart'):
         super().__init__()
         self.scene = QGraphicsScene()
         # Create a very large scene to enable infinite panning
@@ -71,9 +112,28 @@ class NodeCanvas(QGraphicsView):
         self.setRubberBandSelectionMode(Qt.IntersectsItemShape)
         self.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOn)
         self.setVerticalScrollBarPolicy(Qt.ScrollBarAlwaysOn)
-        self.setViewportUpdateMode(QGraphicsView.FullViewportUpdate)
+        # Repaint only dirty regions instead of the whole viewport
+        self.set_viewport_update_mode(viewport_update_mode)
         
-        self.connections = []
+        # Connections in creation order, as dict keys so one can be removed without a scan
+        self.connections = {}
+        # Ordered registry of the canvas nodes, keyed by TextNode.node_id
+        self.nodes = {}
+        # Per-node edge index so graph operations only touch incident edges
+        self.outgoing_connections = {}  # node -> [Connection, ...]
+        self.incoming_connections = {}  # node -> [Connection, ...]
+        self.file_format = project_file.DEFAULT_FORMAT  # Format of the last loaded/saved file
+        # Background save/load state
+        self.save_task = None
+        self.load_task = None
+        self.load_builder = None
+        self.load_chunk_size = 200  # Items created per event loop pass while loading
+        self.journal_seq = 0  # Last autosave journal entry included in the loaded/saved file
+        self.legacy_node_ids = False  # Loaded file keyed nodes by id(), so ids are not on disk yet
+        # Near-duplicate detection, kept up to date with edits (needs numpy)
+        self.duplicate_index = DuplicateIndex() if duplicates.numpy is not None else None
+        if self.duplicate_index:
+            self.edited.connect(self.duplicate_index.mark_edited)
         self.dragging_node = None
         self.temp_connection = None
         self.selected_node = None # Initialize selected_node
@@ -84,7 +144,6 @@ class NodeCanvas(QGraphicsView):
         self.setVerticalScrollBarPolicy(Qt.ScrollBarAlwaysOn)
         self.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOn)
         self.setRenderHint(QPainter.Antialiasing)
-        self.setViewportUpdateMode(QGraphicsView.FullViewportUpdate)
         
         # Set zoom range limits
         self.zoom_in_factor = 1.25
@@ -133,6 +192,18 @@ class NodeCanvas(QGraphicsView):
         self.last_tablet_click_time = 0  # Add this line only
         self.last_tablet_pos = None      # Add this line only
 
+    def set_viewport_update_mode(self, mode):
+        """Set how the viewport repaints: 'full', 'minimal', 'smart' or 'bounding'"""
+        self.viewport_update_mode = mode if mode in self.VIEWPORT_UPDATE_MODES else 'smart'
+        self.setViewportUpdateMode(self.VIEWPORT_UPDATE_MODES[self.viewport_update_mode])
+
+    def set_level_of_detail(self, title_scale=0.4, block_scale=0.15, line_scale=0.4):
+        """Set the view scales below which nodes and connections use simplified drawing"""
+        TextNode.lod_title_scale = title_scale
+        TextNode.lod_block_scale = block_scale
+        Connection.lod_line_scale = line_scale
+        self.viewport().update()
+
     def set_background_color(self, color):
         """Sets the background color for the view and scene."""
         self.background_color = color
@@ -143,27 +214,61 @@ class NodeCanvas(QGraphicsView):
     def clear_all_nodes(self):
         """Remove all nodes and connections from the canvas."""
         # Remove all connections first
-        for conn in self.connections[:]: # Iterate over a copy
+        for conn in self.connections:
             self.scene.removeItem(conn)
         self.connections.clear()
+        self.outgoing_connections.clear()
+        self.incoming_connections.clear()
 
         # Remove all nodes
-        nodes_to_remove = [item for item in self.scene.items() if isinstance(item, TextNode)]
-        for node in nodes_to_remove:
+        for node in self.nodes.values():
             self.scene.removeItem(node)
+        self.nodes.clear()
 
         # Reset node counter and selection
         self.node_counter = 0
         self.selected_node = None
         self.scene.clearSelection()
         self.scene.update() # Ensure the view reflects the changes
+        self.edited.emit('clear', None)
 
-    def add_node(self, title, text):
+    def add_node(self, title, text, node_id=None):
         self.node_counter += 1  # Increment counter
         node = TextNode(title, text)
+        # Keep a given persistent id unless another node already uses it
+        if is_persistent_node_id(node_id) and node_id not in self.nodes:
+            node.node_id = node_id
         node.order_number = self.node_counter  # Assign number to node
-        self.scene.addItem(node)
+        self.register_node(node)
+        self.edited.emit('create', node)
         return node
+
+    def register_node(self, node):
+        """Add a node to the scene and the node registry"""
+        self.scene.addItem(node)
+        self.nodes[node.node_id] = node
+
+    def unregister_node(self, node):
+        """Remove a node from the scene and the node registry"""
+        self.scene.removeItem(node)
+        self.nodes.pop(node.node_id, None)
+
+    def node_changed(self, node, change):
+        """Called by a node after a 'move', 'resize', 'text' or 'color' change"""
+        self.edited.emit(change, node)
+
+    def node_data(self, node):
+        """Serializable state of a single node"""
+        return {
+            'title': node.title,
+            'text': node.text,
+            'pos_x': node.pos().x(),
+            'pos_y': node.pos().y(),
+            'width': node.width,
+            'height': node.height,
+            'color': node.current_color,
+            'order_number': node.order_number
+        }
         
     def mouseDoubleClickEvent(self, event):
         # Ignore synthesized mouse events from tablet buttons
@@ -193,27 +298,17 @@ class NodeCanvas(QGraphicsView):
                 
                 # Check if clicking on a socket
                 if item.get_input_socket_rect().contains(local_pos) and item.input_connected:
-                    # Find and disconnect the existing connection
-                    for conn in self.connections[:]:  # Use slice to allow removal during iteration
-                        if conn.end_node == item:
-                            self.start_connection(conn.start_node, 'output')
-                            conn.start_node.output_connected = False
-                            item.input_connected = False
-                            self.scene.removeItem(conn)
-                            self.connections.remove(conn)
-                            break
+                    # Disconnect the existing connection and re-drag it from its source
+                    conn = self.connections_to(item)[0]
+                    self.start_connection(conn.start_node, 'output')
+                    self.remove_connection(conn)
                     event.accept()
                     return
                 elif item.get_output_socket_rect().contains(local_pos) and item.output_connected:
-                    # Find and disconnect the existing connection
-                    for conn in self.connections[:]:
-                        if conn.start_node == item:
-                            self.start_connection(item, 'output')
-                            conn.end_node.input_connected = False
-                            item.output_connected = False
-                            self.scene.removeItem(conn)
-                            self.connections.remove(conn)
-                            break
+                    # Disconnect the existing connection and re-drag it from this node
+                    conn = self.connections_from(item)[0]
+                    self.start_connection(item, 'output')
+                    self.remove_connection(conn)
                     event.accept()
                     return
                 # If no existing connection, start a new one
@@ -248,15 +343,11 @@ class NodeCanvas(QGraphicsView):
             self.last_mouse_pos = event.pos()
             event.accept()
         elif self.dragging_connection:
-            self.temp_connection_end = self.mapToScene(event.pos())
-            self.scene.update()
+            self.update_temp_connection(self.mapToScene(event.pos()))
             event.accept()
         else:
+            # Moved nodes re-route their own connections from TextNode.itemChange
             super().mouseMoveEvent(event)
-            if self.dragging_node:
-                # Update all connections positions when moving nodes
-                for conn in self.connections:
-                    conn.update_position()
 
     def mouseReleaseEvent(self, event):
         if event.button() == Qt.RightButton:
@@ -287,149 +378,270 @@ class NodeCanvas(QGraphicsView):
             self.dragging_node = None
             super().mouseReleaseEvent(event)
 
-    def save_to_file(self, filename):
-        """Save the entire project to a .dou file"""
-        try:
-            # Collect all nodes data
-            nodes_data = {}
-            node_items = [item for item in self.scene.items() if isinstance(item, TextNode)]
-            
-            for node in node_items:
-                # Create a unique ID for each node
-                node_id = str(id(node))
-                nodes_data[node_id] = {
-                    'title': node.title,
-                    'text': node.text,
-                    'pos_x': node.pos().x(),
-                    'pos_y': node.pos().y(),
-                    'width': node.width,
-                    'height': node.height,
-                    'color': node.current_color,
-                    'order_number': node.order_number
-                }
-            
-            # Collect all connections data
-            connections_data = []
-            for conn in self.connections:
-                start_id = str(id(conn.start_node))
-                end_id = str(id(conn.end_node))
-                
-                if start_id in nodes_data and end_id in nodes_data:
-                    connections_data.append({
-                        'start_node': start_id,
-                        'end_node': end_id,
-                        'edge_type': conn.edge_type
-                    })
-            
-            # Prepare data structure for the file
-            project_data = {
-                'nodes': nodes_data,
-                'connections': connections_data,
-                'background_color': [ # Store color as RGB list
-                    self.background_color.red(),
-                    self.background_color.green(),
-                    self.background_color.blue()
-                ],
-                'version': '1.1'  # Increment version for new feature
-            }
+    def collect_project_data(self):
+        """Snapshot the project into plain data that can be serialized off the GUI thread"""
+        # Collect all nodes data
+        nodes_data = {}
+        for node_id, node in self.nodes.items():
+            # Nodes are keyed by their persistent UUID
+            nodes_data[node_id] = self.node_data(node)
+        
+        # Collect all connections data
+        connections_data = []
+        for conn in self.connections:
+            start_id = conn.start_node.node_id
+            end_id = conn.end_node.node_id
             
+            if start_id in nodes_data and end_id in nodes_data:
+                connections_data.append({
+                    'start_node': start_id,
+                    'end_node': end_id,
+                    'edge_type': conn.edge_type
+                })
+        
+        # Prepare data structure for the file
+        return {
+            'nodes': nodes_data,
+            'connections': connections_data,
+            'background_color': [ # Store color as RGB list
+                self.background_color.red(),
+                self.background_color.green(),
+                self.background_color.blue()
+            ],
+            'version': '1.2',  # 1.2: nodes keyed by persistent UUIDs
+            'journal_seq': self.journal_seq
+        }
+
+    def save_to_file(self, filename, file_format=None):
+        """Save the entire project to a .dou file, keeping the current file format by default"""
+        try:
             # Write to file
-            with open(filename, 'w', encoding='utf-8') as file:
-                json.dump(project_data, file, indent=2)
+            file_format = file_format or self.file_format
+            project_file.write(filename, self.collect_project_data(), file_format)
+            self.file_format = file_format
                 
             return True
             
         except Exception as e:
             QMessageBox.critical(None, "Save Error", f"Failed to save project: {str(e)}")
             return False
+
+    def save_to_file_async(self, filename, file_format=None):
+        """Snapshot the project, then encode and write it on a worker thread.
+
+        Emits save_finished(success) when done.
+        """
+        file_format = file_format or self.file_format
+        task = BackgroundTask(project_file.write, filename, self.collect_project_data(), file_format)
+        task.kwargs['is_cancelled'] = task.is_cancelled
+        task.finished.connect(lambda result, error: self._on_project_saved(task, file_format, error))
+        self.save_task = task
+        task.start()
+
+    def cancel_save(self):
+        """Abandon a background save; the existing file is left untouched"""
+        if self.save_task:
+            self.save_task.cancel()
+
+    def _on_project_saved(self, task, file_format, error):
+        if task is self.save_task:
+            self.save_task = None
+        if error is not None:
+            QMessageBox.critical(None, "Save Error", f"Failed to save project: {str(error)}")
+            self.save_finished.emit(False)
+        elif task.cancelled:
+            self.save_finished.emit(False)
+        else:
+            self.file_format = file_format
+            self.legacy_node_ids = False  # The saved file has the node UUIDs
+            self.save_finished.emit(True)
             
     def load_from_file(self, filename):
         """Load a project from a .dou file"""
         try:
-            # Clear existing canvas
-            self.clear_all_nodes() # Use the method to clear nodes/connections
-            self.connections = []
-            self.selected_node = None
+            # Read file, detecting compact and compressed formats
+            project_data, file_format = project_file.read(filename)
+            for _ in self.build_project(project_data):
+                pass
+            self.file_format = file_format
             
-            # Read file
-            with open(filename, 'r', encoding='utf-8') as file:
-                project_data = json.load(file)
+            return True
             
-            # Check version for compatibility
-            version = project_data.get('version', '1.0')
-
-            # Load background color if present (version 1.1+)
-            if 'background_color' in project_data:
-                rgb = project_data['background_color']
-                loaded_color = QColor(rgb[0], rgb[1], rgb[2])
-                self.set_background_color(loaded_color)
+        except Exception as e:
+            QMessageBox.critical(None, "Load Error", f"Failed to load project: {str(e)}")
+            return False
+
+    def load_from_file_async(self, filename):
+        """Read and parse a project on a worker thread, then create its items in chunks.
+
+        Emits load_progress(done, total) while items are created and
+        load_finished(success) at the end. The canvas is only cleared once the
+        file has been parsed, so a failed or cancelled read keeps the current project.
+        """
+        self.cancel_load()
+        task = BackgroundTask(project_file.read, filename)
+        task.finished.connect(lambda result, error: self._on_project_read(task, result, error))
+        self.load_task = task
+        task.start()
+
+    def is_loading(self):
+        return self.load_task is not None or self.load_builder is not None
+
+    def cancel_load(self):
+        """Stop a background load; a partially built canvas is cleared"""
+        if self.load_task:
+            self.load_task.cancel()
+            self.load_task = None
+            self.load_finished.emit(False)
+        if self.load_builder:
+            self.load_builder.close()
+            self.load_builder = None
+            self.clear_all_nodes()
+            self.load_finished.emit(False)
+
+    def _on_project_read(self, task, result, error):
+        if task is not self.load_task:
+            return  # Cancelled or superseded by another load
+        self.load_task = None
+        if error is not None:
+            QMessageBox.critical(None, "Load Error", f"Failed to load project: {str(error)}")
+            self.load_finished.emit(False)
+            return
+        project_data, self.file_format = result
+        self.load_builder = self.build_project(project_data)
+        self._load_next_chunk()
+
+    def _load_next_chunk(self):
+        if not self.load_builder:
+            return
+        try:
+            done, total = next(self.load_builder)
+        except StopIteration:
+            self.load_builder = None
+            self.load_finished.emit(True)
+            return
+        except Exception as e:
+            self.load_builder = None
+            self.clear_all_nodes()
+            QMessageBox.critical(None, "Load Error", f"Failed to load project: {str(e)}")
+            self.load_finished.emit(False)
+            return
+        self.load_progress.emit(done, total)
+        # Let the event loop paint and handle input between chunks
+        QTimer.singleShot(0, self._load_next_chunk)
+
+    def build_project(self, project_data):
+        """Replace the canvas contents with the given project data.
+
+        A generator creating items in chunks of load_chunk_size, yielding
+        (items_done, items_total) after each chunk. Nodes nearest the centre of
+        the view are created first; the node registry still ends up in file
+        order, which decides save order, path order and numbering ties.
+        """
+        # Clear existing canvas
+        self.clear_all_nodes() # Use the method to clear nodes/connections
+        self.selected_node = None
+        
+        # Check version for compatibility
+        version = project_data.get('version', '1.0')
+        self.journal_seq = project_data.get('journal_seq', 0)
+        self.legacy_node_ids = False
+
+        # Load background color if present (version 1.1+)
+        if 'background_color' in project_data:
+            rgb = project_data['background_color']
+            loaded_color = QColor(rgb[0], rgb[1], rgb[2])
+            self.set_background_color(loaded_color)
+        else:
+            # Set default if loading older file
+            self.set_background_color(QColor(60, 60, 60))
+        
+        # Fit view to content
+        self.resetZoom()
+
+        # Order nodes by distance from the visible centre so the view fills in first
+        center = self.mapToScene(self.viewport().rect().center())
+        nodes_items = sorted(
+            project_data['nodes'].items(),
+            key=lambda item: (item[1]['pos_x'] - center.x()) ** 2 + (item[1]['pos_y'] - center.y()) ** 2
+        )
+        connections_data = project_data['connections']
+        total = len(nodes_items) + len(connections_data)
+        done = 0
+        
+        # Temporary dictionary to map saved node IDs to new node objects
+        id_to_node = {}
+        
+        # Create all nodes first
+        for node_id, node_data in nodes_items:
+            node = TextNode(node_data['title'], node_data['text'])
+            # Files before version 1.2 key nodes by id(), which gets a fresh UUID
+            if is_persistent_node_id(node_id) and node_id not in self.nodes:
+                node.node_id = node_id
             else:
-                # Set default if loading older file
-                self.set_background_color(QColor(60, 60, 60))
-            
-            # Temporary dictionary to map saved node IDs to new node objects
-            id_to_node = {}
-            
-            # Create all nodes first
-            for node_id, node_data in project_data['nodes'].items():
-                node = TextNode(node_data['title'], node_data['text'])
-                
-                # Set node properties
-                node.width = node_data['width']
-                node.height = node_data['height']
-                node.setPos(node_data['pos_x'], node_data['pos_y'])
-                node.order_number = node_data['order_number']
-                
-                # Set color if saved
-                if 'color' in node_data:
-                    node.set_color(node_data['color'])
-                
-                # Add to scene and mapping
-                self.scene.addItem(node)
-                id_to_node[node_id] = node
-            
-            # Create all connections
-            for conn_data in project_data['connections']:
-                start_node = id_to_node.get(conn_data['start_node'])
-                end_node = id_to_node.get(conn_data['end_node'])
-                
-                if start_node and end_node:
-                    # Create connection with the same edge type
-                    connection = Connection(start_node, end_node, conn_data['edge_type'])
-                    self.scene.addItem(connection)
-                    self.connections.append(connection)
-                    
-                    # Update connected state of nodes
-                    start_node.output_connected = True
-                    end_node.input_connected = True
+                self.legacy_node_ids = True
             
-            # Renumber nodes to ensure order is correctly shown
-            self.renumber_nodes()
+            # Set node properties
+            node.width = node_data['width']
+            node.height = node_data['height']
+            node.setPos(node_data['pos_x'], node_data['pos_y'])
+            node.order_number = node_data['order_number']
             
-            # Fit view to content
-            self.resetZoom()
+            # Set color if saved
+            if 'color' in node_data:
+                node.set_color(node_data['color'])
             
-            return True
+            # Add to scene, registry and mapping
+            self.register_node(node)
+            id_to_node[node_id] = node
+            done += 1
+            if done % self.load_chunk_size == 0:
+                yield done, total
+
+        # Put the registry back in file order, followed by nodes added while loading
+        loaded = [id_to_node[node_id] for node_id in project_data['nodes']
+                  if id_to_node[node_id].node_id in self.nodes]
+        loaded_ids = {node.node_id for node in loaded}
+        others = [node for node_id, node in self.nodes.items() if node_id not in loaded_ids]
+        self.nodes = {node.node_id: node for node in loaded + others}
+        
+        # Create all connections
+        for conn_data in connections_data:
+            start_node = id_to_node.get(conn_data['start_node'])
+            end_node = id_to_node.get(conn_data['end_node'])
             
-        except Exception as e:
-            QMessageBox.critical(None, "Load Error", f"Failed to load project: {str(e)}")
-            return False
+            # Skip nodes the user already deleted while the load was running
+            if (start_node and end_node and start_node.node_id in self.nodes
+                    and end_node.node_id in self.nodes):
+                # Create connection with the same edge type
+                connection = Connection(start_node, end_node, conn_data['edge_type'])
+                self.add_connection(connection)
+            done += 1
+            if done % self.load_chunk_size == 0:
+                yield done, total
+        
+        # Renumber nodes to ensure order is correctly shown
+        self.renumber_nodes()
+        yield total, total
 
     def get_path_from_node(self, start_node):
         """Extract text from connected nodes starting from given node."""
         nodes = []
         visited = set()
+        stack = [start_node]
         
-        def traverse_nodes(node):
+        # Iterative depth-first walk over the outgoing edge index
+        while stack:
+            node = stack.pop()
             if node in visited:
-                return
+                continue
             visited.add(node)
             nodes.append(node)
-            for conn in self.connections:
-                if conn.start_node == node:
-                    traverse_nodes(conn.end_node)
+            # Push in reverse so the first connection is visited first
+            for conn in reversed(self.connections_from(node)):
+                if conn.end_node not in visited:
+                    stack.append(conn.end_node)
                     
-        traverse_nodes(start_node)
         return nodes
 
     def get_all_paths(self):
@@ -438,9 +650,8 @@ class NodeCanvas(QGraphicsView):
         visited = set()
         
         # Find root nodes (nodes with no incoming connections)
-        root_nodes = [item for item in self.scene.items() 
-                     if isinstance(item, TextNode) and 
-                     not any(conn.end_node == item for conn in self.connections)]
+        root_nodes = [node for node in self.nodes.values()
+                      if not self.incoming_connections.get(node)]
         
         for root in root_nodes:
             if root not in visited:
@@ -480,7 +691,7 @@ class NodeCanvas(QGraphicsView):
 
     def renumber_nodes(self):
         """Renumber all nodes sequentially based on current order numbers"""
-        nodes = [item for item in self.scene.items() if isinstance(item, TextNode)]
+        nodes = list(self.nodes.values())
         if not nodes:
             self.node_counter = 0  # Reset counter if no nodes left
             return
@@ -490,35 +701,69 @@ class NodeCanvas(QGraphicsView):
         
         # Reassign numbers sequentially
         for i, node in enumerate(nodes, 1):
-            node.order_number = i
-            node.update()
+            if node.order_number != i:
+                node.order_number = i
+                node.update()
         self.node_counter = len(nodes)
 
+    def find_duplicates(self):
+        """Return (groups, overlaps) of near-duplicate nodes.
+
+        groups is a list of node lists with nearly identical texts; overlaps is
+        a list of (node, node, share) where most of one text is in the other.
+        """
+        groups, overlaps = self.duplicate_index.find(self.nodes)
+        order = lambda node: node.order_number if node.order_number is not None else float('inf')
+        groups = sorted((sorted((self.nodes[node_id] for node_id in group), key=order) for group in groups),
+                        key=lambda group: order(group[0]))
+        overlaps = [(self.nodes[a], self.nodes[b], share) for a, b, share in overlaps]
+        return groups, overlaps
+
+    def select_nodes(self, nodes):
+        """Replace the selection with the given nodes"""
+        self.scene.clearSelection()
+        for node in nodes:
+            node.setSelected(True)
+
     def delete_selected_nodes(self):
         selected_nodes = [item for item in self.scene.selectedItems() if isinstance(item, TextNode)]
+        self.delete_nodes(selected_nodes)
+
+    def delete_nodes(self, selected_nodes):
+        """Delete the given nodes together with their connections"""
         if not selected_nodes:
             return
 
-        # Remove connections first
-        connections_to_remove = []
-        for conn in self.connections:
-            if conn.start_node in selected_nodes or conn.end_node in selected_nodes:
-                # Update socket connection states
-                if conn.start_node not in selected_nodes:
+        # Remove connections first, looking only at edges incident to the selection
+        connections_to_remove = set()
+        for node in selected_nodes:
+            connections_to_remove.update(self.outgoing_connections.pop(node, ()))
+            connections_to_remove.update(self.incoming_connections.pop(node, ()))
+
+        selected = set(selected_nodes)
+        for conn in connections_to_remove:
+            self.scene.removeItem(conn)
+            del self.connections[conn]
+            # Update socket connection states of surviving neighbours
+            if conn.start_node not in selected:
+                outgoing = self.outgoing_connections.get(conn.start_node, [])
+                outgoing.remove(conn)
+                if not outgoing:
+                    self.outgoing_connections.pop(conn.start_node, None)
                     conn.start_node.output_connected = False
-                    conn.start_node.update()
-                if conn.end_node not in selected_nodes:
+                conn.start_node.update()
+            if conn.end_node not in selected:
+                incoming = self.incoming_connections.get(conn.end_node, [])
+                incoming.remove(conn)
+                if not incoming:
+                    self.incoming_connections.pop(conn.end_node, None)
                     conn.end_node.input_connected = False
-                    conn.end_node.update()
-                connections_to_remove.append(conn)
-                self.scene.removeItem(conn)
-                
-        for conn in connections_to_remove:
-            self.connections.remove(conn)
+                conn.end_node.update()
 
         # Remove the nodes
         for node in selected_nodes:
-            self.scene.removeItem(node)
+            self.unregister_node(node)
+            self.edited.emit('delete', node)
 
         # Renumber remaining nodes
         self.renumber_nodes()
@@ -567,52 +812,115 @@ class NodeCanvas(QGraphicsView):
         self.temp_connection_end = node.scenePos()
 
     def end_connection(self):
+        dirty_rect = self.temp_connection_rect()
         self.dragging_connection = False
         self.connection_start_node = None
         self.connection_start_socket = None
         self.temp_connection_end = None
-        self.scene.update()
+        if not dirty_rect.isNull():
+            self.scene.update(dirty_rect)
+
+    def update_temp_connection(self, end_pos):
+        """Move the end of the temporary connection, repainting only the area it covers"""
+        old_rect = self.temp_connection_rect()
+        self.temp_connection_end = end_pos
+        self.scene.update(old_rect.united(self.temp_connection_rect()))
+
+    def temp_connection_path(self):
+        """Build the Bézier path of the connection being dragged"""
+        if self.connection_start_socket == 'output':
+            start_pos = self.connection_start_node.scenePos() + \
+                       self.connection_start_node.get_output_socket_pos()
+        else:
+            start_pos = self.connection_start_node.scenePos() + \
+                       self.connection_start_node.get_input_socket_pos()
+
+        path = QPainterPath()
+        path.moveTo(start_pos)
+        
+        dx = self.temp_connection_end.x() - start_pos.x()
+        
+        ctrl1 = QPointF(start_pos.x() + dx/3, start_pos.y())
+        ctrl2 = QPointF(start_pos.x() + 2*dx/3, self.temp_connection_end.y())
+        
+        path.cubicTo(ctrl1, ctrl2, self.temp_connection_end)
+        return path
+
+    def temp_connection_rect(self):
+        """Scene rect covered by the temporary connection, including its pen width"""
+        if not (self.dragging_connection and self.connection_start_node
+                and self.temp_connection_end is not None):
+            return QRectF()
+        return self.temp_connection_path().boundingRect().adjusted(-4, -4, 4, 4)
 
     def create_connection(self, start_node, end_node):
         # Check if connection already exists
-        for conn in self.connections:
-            if conn.start_node == start_node and conn.end_node == end_node:
+        for conn in self.connections_from(start_node):
+            if conn.end_node == end_node:
                 return
 
         connection = Connection(start_node, end_node, "right")
+        self.add_connection(connection)
+        start_node.update()
+        end_node.update()
+        self.edited.emit('connect', connection)
+
+    def add_connection(self, connection):
+        """Add a connection to the scene and the per-node edge index"""
         self.scene.addItem(connection)
-        self.connections.append(connection)
+        self.connections[connection] = None
+        self.outgoing_connections.setdefault(connection.start_node, []).append(connection)
+        self.incoming_connections.setdefault(connection.end_node, []).append(connection)
         
         # Update socket connection states
-        start_node.output_connected = True
-        end_node.input_connected = True
+        connection.start_node.output_connected = True
+        connection.end_node.input_connected = True
+
+    def remove_connection(self, connection):
+        """Remove a connection from the scene and the per-node edge index"""
+        self.scene.removeItem(connection)
+        del self.connections[connection]
+        start_node = connection.start_node
+        end_node = connection.end_node
+
+        outgoing = self.outgoing_connections.get(start_node, [])
+        if connection in outgoing:
+            outgoing.remove(connection)
+        if not outgoing:
+            self.outgoing_connections.pop(start_node, None)
+        incoming = self.incoming_connections.get(end_node, [])
+        if connection in incoming:
+            incoming.remove(connection)
+        if not incoming:
+            self.incoming_connections.pop(end_node, None)
+
+        # A socket stays connected while any other edge still uses it
+        start_node.output_connected = start_node in self.outgoing_connections
+        end_node.input_connected = end_node in self.incoming_connections
         start_node.update()
         end_node.update()
+        self.edited.emit('disconnect', connection)
+
+    def update_node_connections(self, node):
+        """Re-route only the connections attached to the given node"""
+        for conn in self.connections_from(node):
+            conn.update_position()
+        for conn in self.connections_to(node):
+            conn.update_position()
+
+    def connections_from(self, node):
+        """Return the connections leaving the given node"""
+        return self.outgoing_connections.get(node, [])
+
+    def connections_to(self, node):
+        """Return the connections entering the given node"""
+        return self.incoming_connections.get(node, [])
 
     def drawForeground(self, painter, rect):
         # Draw temporary connection while dragging
         if self.dragging_connection and self.connection_start_node:
             painter.setPen(QPen(QColor(0, 120, 215), 4))
-            
-            if self.connection_start_socket == 'output':
-                start_pos = self.connection_start_node.scenePos() + \
-                           self.connection_start_node.get_output_socket_pos()
-            else:
-                start_pos = self.connection_start_node.scenePos() + \
-                           self.connection_start_node.get_input_socket_pos()
-
-            # Create temporary Bézier curve
-            path = QPainterPath()
-            path.moveTo(start_pos)
-            
-            dx = self.temp_connection_end.x() - start_pos.x()
-            dy = self.temp_connection_end.y()
-            
-            ctrl1 = QPointF(start_pos.x() + dx/3, start_pos.y())
-            ctrl2 = QPointF(start_pos.x() + 2*dx/3, self.temp_connection_end.y())
-            
-            path.cubicTo(ctrl1, ctrl2, self.temp_connection_end)
-            painter.drawPath(path)
+            painter.drawPath(self.temp_connection_path())
 
         super().drawForeground(painter, rect)
 
@@ -626,6 +934,7 @@ class NodeCanvas(QGraphicsView):
         nodes_data = []
         for node in nodes:
             nodes_data.append({
+                'id': node.node_id,
                 'title': node.title,
                 'text': node.text,
                 'pos': [node.pos().x(), node.pos().y()],
@@ -667,8 +976,8 @@ class NodeCanvas(QGraphicsView):
                     offset_x = node_data['pos'][0] - min_x
                     offset_y = node_data['pos'][1] - min_y
                     
-                    # Create new node
-                    new_node = self.add_node(node_data['title'], node_data['text'])
+                    # Create new node; it keeps the copied id when the original is gone (cut and paste)
+                    new_node = self.add_node(node_data['title'], node_data['text'], node_data.get('id'))
                     new_node.setPos(cursor_pos.x() + offset_x, cursor_pos.y() + offset_y)
                     new_node.width = node_data['width']
                     new_node.height = node_data['height']
@@ -716,8 +1025,6 @@ class NodeCanvas(QGraphicsView):
                         new_node = self.add_node("New Node", "Enter text here...")
                         new_node.setPos(scene_pos)
                         self.node_selected.emit(new_node)
-                        new_node.update()
-                        self.scene.update()
                         event.accept()
                         self.last_tablet_click_time = 0
                         self.last_tablet_pos = None
@@ -735,15 +1042,10 @@ class NodeCanvas(QGraphicsView):
                 # Check input socket
                 if item.get_input_socket_rect().contains(item_pos):
                     if item.input_connected:
-                        # Find and disconnect existing connection
-                        for conn in self.connections[:]:
-                            if conn.end_node == item:
-                                self.start_connection(conn.start_node, 'output')
-                                conn.start_node.output_connected = False
-                                item.input_connected = False
-                                self.scene.removeItem(conn)
-                                self.connections.remove(conn)
-                                break
+                        # Disconnect existing connection and re-drag it from its source
+                        conn = self.connections_to(item)[0]
+                        self.start_connection(conn.start_node, 'output')
+                        self.remove_connection(conn)
                     else:
                         self.start_connection(item, 'input')
                     event.accept()
@@ -752,15 +1054,10 @@ class NodeCanvas(QGraphicsView):
                 # Check output socket
                 if item.get_output_socket_rect().contains(item_pos):
                     if item.output_connected:
-                        # Find and disconnect existing connection
-                        for conn in self.connections[:]:
-                            if conn.start_node == item:
-                                self.start_connection(item, 'output')
-                                conn.end_node.input_connected = False
-                                item.output_connected = False
-                                self.scene.removeItem(conn)
-                                self.connections.remove(conn)
-                                break
+                        # Disconnect existing connection and re-drag it from this node
+                        conn = self.connections_from(item)[0]
+                        self.start_connection(item, 'output')
+                        self.remove_connection(conn)
                     else:
                         self.start_connection(item, 'output')
                     event.accept()
@@ -793,24 +1090,20 @@ class NodeCanvas(QGraphicsView):
                     
             if resizing_node:
                 item_pos = resizing_node.mapFromScene(scene_pos)
+                # Announce the geometry change first so the old area is repainted too
+                resizing_node.prepareGeometryChange()
                 resizing_node.width = max(100, item_pos.x())
                 resizing_node.height = max(100, item_pos.y())
-                resizing_node.prepareGeometryChange()
-                
-                # Update all connections
-                for conn in self.connections:
-                    if conn.start_node == resizing_node or conn.end_node == resizing_node:
-                        conn.update_position()
                 
-                resizing_node.update()
-                self.scene.update()
+                # Update the connections attached to the resized node
+                self.update_node_connections(resizing_node)
+                self.node_changed(resizing_node, 'resize')
                 event.accept()
                 return
                 
             # Handle connection dragging (existing code)
             if self.dragging_connection:
-                self.temp_connection_end = scene_pos
-                self.scene.update()
+                self.update_temp_connection(scene_pos)
                 event.accept()
                 return
                 
@@ -0,0 +1,103 @@
+"""Encoding and decoding of .dou project files.
+
+A .dou file is a JSON document, either pretty-printed (the original format),
+compact, or compact and compressed with gzip or zstd. The format is detected
+when reading, so every variant loads the same way.
+"""
+import codecs
+import gzip
+import json
+import os
+import threading
+
+# Optional faster JSON backend
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Optional zstd compression
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+GZIP_MAGIC = b'\x1f\x8b'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+# Save formats with their file dialog labels
+FORMAT_LABELS = {
+    'pretty': "Dou (*.dou)",
+    'compact': "Dou, compact (*.dou)",
+    'gzip': "Dou, compressed with gzip (*.dou)",
+}
+if zstandard is not None:
+    FORMAT_LABELS['zstd'] = "Dou, compressed with zstd (*.dou)"
+
+DEFAULT_FORMAT = 'pretty'
+
+
+def encode_json(project_data, pretty=False):
+    """Serialize project data to UTF-8 JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(project_data, option=orjson.OPT_INDENT_2 if pretty else 0)
+    if pretty:
+        return json.dumps(project_data, indent=2).encode('utf-8')
+    return json.dumps(project_data, separators=(',', ':')).encode('utf-8')
+
+
+def decode_json(raw):
+    """Parse UTF-8 JSON bytes"""
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw.decode('utf-8'))
+
+
+def encode(project_data, file_format=DEFAULT_FORMAT):
+    """Serialize project data to the bytes of a .dou file in the given format"""
+    if file_format not in FORMAT_LABELS:
+        raise ValueError(f"Unknown project file format: {file_format}")
+    raw = encode_json(project_data, pretty=file_format == 'pretty')
+    if file_format == 'gzip':
+        return gzip.compress(raw, compresslevel=6)
+    if file_format == 'zstd':
+        return zstandard.ZstdCompressor().compress(raw)
+    return raw
+
+
+def decode(raw):
+    """Parse the bytes of a .dou file, returning (project_data, file_format)"""
+    if raw.startswith(GZIP_MAGIC):
+        return decode_json(gzip.decompress(raw)), 'gzip'
+    if raw.startswith(ZSTD_MAGIC):
+        if zstandard is None:
+            raise ValueError("This project is zstd compressed; install the 'zstandard' package to open it")
+        return decode_json(zstandard.ZstdDecompressor().decompressobj().decompress(raw)), 'zstd'
+    # Uncompressed JSON; pretty-printed files start with a newline after the brace
+    raw = raw.removeprefix(codecs.BOM_UTF8)
+    file_format = 'pretty' if raw[1:2] in (b'\n', b'\r') else 'compact'
+    return decode_json(raw), file_format
+
+
+def write(filename, project_data, file_format=DEFAULT_FORMAT, is_cancelled=None):
+    """Write a project file, replacing any existing file only once fully written.
+
+    is_cancelled is an optional callable polled before the file is replaced.
+    """
+    data = encode(project_data, file_format)
+    if is_cancelled and is_cancelled():
+        return
+    # One temporary file per writing thread, so an autosave and a save can't write into the same one
+    temp_filename = f'{filename}.{threading.get_ident()}.tmp'
+    with open(temp_filename, 'wb') as file:
+        file.write(data)
+    if is_cancelled and is_cancelled():
+        os.remove(temp_filename)
+        return
+    os.replace(temp_filename, filename)
+
+
+def read(filename):
+    """Read a project file, returning (project_data, file_format)"""
+    with open(filename, 'rb') as file:
+        return decode(file.read())
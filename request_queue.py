@@ -0,0 +1,127 @@
+"""Queue of chat questions, answered a few at a time per server.
+
+Questions keep the paths and options chosen when they were asked. Each server
+runs up to its own limit of questions at once, so Ollama and LM Studio answer
+in parallel. Questions to one model about the same paths run one after
+another, so a follow-up sees the answer before it.
+"""
+from PySide6.QtCore import *
+
+# Questions answered at once by one server
+DEFAULT_SERVER_CONCURRENCY = 1
+
+
+class ChatJob:
+    """A question with everything captured when it was asked, and the state of its answer"""
+
+    def __init__(self, message, paths, server, model, key, options):
+        self.message = message
+        self.paths = paths  # Node lists selected when the question was asked
+        self.server = server
+        self.model = model
+        self.key = key  # Conversation the question belongs to
+        self.options = options  # Chat options at submit time, such as 'use_cache' and 'map_reduce'
+        self.state = 'queued'  # 'queued', 'running' or 'done'
+
+        # Set while the answer is produced
+        self.stream_request = None
+        self.map_request = None
+        self.retrieval_task = None  # Embedding of the question and changed nodes
+        self.embedding_entries = None  # Nodes embedded by retrieval_task
+        self.map_titles = self.map_answers = None  # Per-path answers of a map-reduce question
+        self.context_length = None
+        self.response_message = None  # ChatMessage of the answer being streamed
+        self.cache_key = None  # Where to store the answer
+        self.pending_turn = None  # (conversation, messages, node ids sent) being answered
+
+    def describe(self):
+        return f"{self.message} ({self.server}, {self.model})"
+
+
+class RequestQueue(QObject):
+    """Start queued ChatJobs as their server and conversation become free.
+
+    start_job(job) is called to begin answering; call finish(job) when done.
+    changed is emitted whenever jobs are added, started, finished or moved.
+    """
+    changed = Signal()
+
+    def __init__(self, start_job):
+        super().__init__()
+        self.start_job = start_job
+        self.queued = []
+        self.running = []
+        self.limits = {}  # server -> questions answered at once
+        self.scheduling = False
+
+    def __bool__(self):
+        return bool(self.queued or self.running)
+
+    def limit(self, server):
+        return self.limits.get(server, DEFAULT_SERVER_CONCURRENCY)
+
+    def set_limit(self, server, limit):
+        self.limits[server] = max(1, limit)
+        self.schedule()
+
+    def submit(self, job):
+        self.queued.append(job)
+        self.schedule()
+
+    def next_job(self):
+        """The first queued job that may start now, or None"""
+        waiting = []
+        for job in self.queued:
+            busy = sum(1 for running in self.running if running.server == job.server)
+            # Keep the questions of one conversation in order
+            if busy < self.limit(job.server) and not any(other.key == job.key for other in self.running + waiting):
+                return job
+            waiting.append(job)
+        return None
+
+    def schedule(self):
+        """Start every queued job that may run now, in queue order"""
+        if self.scheduling:
+            return  # A job finished while starting; the running loop picks up the change
+        self.scheduling = True
+        try:
+            job = self.next_job()
+            while job:
+                self.queued.remove(job)
+                self.running.append(job)
+                job.state = 'running'
+                self.start_job(job)
+                job = self.next_job()
+        finally:
+            self.scheduling = False
+        self.changed.emit()
+
+    def finish(self, job):
+        if job in self.running:
+            self.running.remove(job)
+        job.state = 'done'
+        self.schedule()
+
+    def cancel(self, job):
+        """Drop a queued job; running jobs are stopped by their owner"""
+        if job in self.queued:
+            self.queued.remove(job)
+            job.state = 'done'
+            self.changed.emit()
+
+    def move(self, job, offset):
+        """Move a queued job up (negative offset) or down the queue"""
+        if job not in self.queued:
+            return
+        index = self.queued.index(job)
+        new_index = min(max(index + offset, 0), len(self.queued) - 1)
+        self.queued.insert(new_index, self.queued.pop(index))
+        self.schedule()
+
+    def clear(self):
+        """Forget all jobs, queued and running"""
+        for job in self.queued + self.running:
+            job.state = 'done'
+        self.queued = []
+        self.running = []
+        self.changed.emit()
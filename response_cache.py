@@ -0,0 +1,87 @@
+"""Persistent cache of LLM answers for repeated questions.
+
+Answers are keyed by server, model, sampling parameters and a hash of the exact
+prompt, kept in least-recently-used order with a size cap, and stored as one
+JSON file so they survive restarts. Reading and writing the file don't touch
+the cache itself, so both can run on a worker thread.
+"""
+from collections import OrderedDict
+import hashlib
+import json
+import os
+import threading
+
+
+def make_key(server, model, parameters, prompt):
+    """Cache key for a request; the prompt is hashed so keys stay short"""
+    prompt_hash = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+    key_data = json.dumps([server, model, parameters, prompt_hash], sort_keys=True)
+    return hashlib.sha256(key_data.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """LRU cache of answers, capped by the total size of the stored answers"""
+
+    def __init__(self, path, max_bytes=8 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key -> answer, least recently used first
+        self.size = 0
+        self.loaded = False  # Whether the file's entries have been merged in
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        """Return the cached answer or None, marking it as recently used"""
+        answer = self.entries.get(key)
+        if answer is not None:
+            self.entries.move_to_end(key)
+        return answer
+
+    def put(self, key, answer):
+        """Store an answer, evicting the least recently used ones over the cap"""
+        if key in self.entries:
+            self.size -= self.answer_size(self.entries.pop(key))
+        self.entries[key] = answer
+        self.size += self.answer_size(answer)
+        while self.size > self.max_bytes and len(self.entries) > 1:
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= self.answer_size(evicted)
+
+    def clear(self):
+        self.entries.clear()
+        self.size = 0
+
+    @staticmethod
+    def answer_size(answer):
+        return len(answer.encode('utf-8'))
+
+    def read(self):
+        """Return the (key, answer) pairs of the cache file; a missing or damaged file has none"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return []
+        return data.get('entries', [])
+
+    def merge(self, entries):
+        """Add entries read from the file, keeping answers stored since as the most recent"""
+        newer = list(self.entries.items())
+        self.clear()
+        for key, answer in list(entries) + newer:
+            self.put(key, answer)
+        self.loaded = True
+
+    def snapshot(self):
+        """The entries to write, taken on the thread that uses the cache"""
+        return list(self.entries.items())
+
+    def write(self, entries):
+        """Write entries to the cache file, replacing the old one only once fully written"""
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        temp_path = f'{self.path}.{threading.get_ident()}.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump({'version': 1, 'entries': entries}, file, separators=(',', ':'))
+        os.replace(temp_path, self.path)
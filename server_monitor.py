@@ -0,0 +1,99 @@
+"""Background health checks of the LLM servers.
+
+Each server is asked for its models every few seconds on a worker thread.
+The answer tells whether the server is up, how long it took to respond and
+what the models are (size, quantization, context length, loaded or not), so
+the chat panel can show readiness and refuse questions for a server that is
+down without waiting for a connection to time out.
+"""
+from PySide6.QtCore import *
+import time
+from llm_client import list_models
+from background import BackgroundTask
+
+# Seconds between checks of each server
+PROBE_INTERVAL = 15
+# A server that doesn't answer within this long is reported as down
+PROBE_TIMEOUT = (2, 5)  # (connect, read) seconds
+
+
+def probe_server(server, base_url):
+    """Return the server's models and the seconds it took to list them"""
+    start = time.perf_counter()
+    models = list_models(server, base_url, timeout=PROBE_TIMEOUT)
+    return models, time.perf_counter() - start
+
+
+class ServerMonitor(QObject):
+    """Keep the state of each server in status, probed in the background.
+
+    status[server] has 'up' (None until the first check), 'latency' in
+    seconds, 'checked' (time.monotonic() of the last check), 'error' and
+    'models' (name -> model info from list_models). updated(server) is
+    emitted after every check.
+    """
+    updated = Signal(str)
+
+    def __init__(self, endpoints, interval=PROBE_INTERVAL):
+        super().__init__()
+        self.endpoints = endpoints  # server -> base URL, shared with the chat panel
+        self.tasks = {}  # server -> running probe
+        self.status = {}
+        self.timer = QTimer(self)
+        self.timer.setInterval(int(interval * 1000))
+        self.timer.timeout.connect(self.probe_all)
+
+    def start(self):
+        self.probe_all()
+        self.timer.start()
+
+    def stop(self):
+        self.timer.stop()
+
+    def probe_all(self):
+        for server in self.endpoints:
+            self.probe(server)
+
+    def probe(self, server, force=False):
+        """Check a server now, unless a check is already running and force is False"""
+        if server in self.tasks and not force:
+            return
+        task = BackgroundTask(probe_server, server, self.endpoints[server])
+        task.server = server
+        task.finished.connect(self.on_probe_finished)
+        self.tasks[server] = task
+        task.start()
+
+    def on_probe_finished(self, result, error):
+        task = self.sender()
+        if task is None or self.tasks.get(task.server) is not task:
+            return
+        del self.tasks[task.server]
+        status = self.status.setdefault(task.server, {'models': {}})
+        status['checked'] = time.monotonic()
+        status['error'] = error
+        if error is None:
+            models, status['latency'] = result
+            status['up'] = True
+            status['models'] = {model['name']: model for model in models}
+        else:
+            # Keep the last known models so their details can still be shown
+            status['up'] = False
+            status['latency'] = None
+        self.updated.emit(task.server)
+
+    def is_up(self, server):
+        """True or False after a check, None while the server hasn't been checked"""
+        return self.status.get(server, {}).get('up')
+
+    def is_fresh(self, server):
+        """Whether the last check is recent enough to rely on"""
+        checked = self.status.get(server, {}).get('checked')
+        return checked is not None and time.monotonic() - checked < self.timer.interval() / 1000
+
+    def models(self, server):
+        """Model names of a server from its last successful check"""
+        return list(self.status.get(server, {}).get('models', {}))
+
+    def model_info(self, server, model):
+        return self.status.get(server, {}).get('models', {}).get(model, {})
@@ -0,0 +1,144 @@
+"""Incremental parsers for the streaming responses of Ollama and LM Studio.
+
+Both work on raw byte chunks as they arrive from the socket. Only the partial
+line at the end of a chunk is carried over to the next one; complete lines are
+split off with bytes.split and decoded by json.loads straight from bytes.
+
+Ollama streams newline-delimited JSON, ending with an object that has
+"done": true and the server's timing statistics. LM Studio streams
+server-sent events: "data:" lines (several make one multi-line event),
+optional "event:" fields, ":" comments used as keep-alives, and a final
+"data: [DONE]".
+"""
+import json
+
+
+class StreamFormatError(ValueError):
+    """The server sent something that is not valid for its protocol"""
+
+
+def decode_json(data):
+    try:
+        return json.loads(data)
+    except ValueError:
+        raise StreamFormatError(f"Invalid JSON from server: {bytes(data[:80])!r}") from None
+
+
+class NDJSONParser:
+    """Split a byte stream into JSON objects, one per line"""
+
+    def __init__(self):
+        self.remainder = b""  # Partial last line
+
+    def feed(self, chunk):
+        """Return the objects completed by a chunk of bytes"""
+        if self.remainder:
+            chunk = self.remainder + chunk
+        lines = chunk.split(b'\n')
+        self.remainder = lines.pop()
+        lines = [line for line in lines if line and not line.isspace()]
+        if not lines:
+            return []
+        try:
+            # One call decodes all lines of the chunk as a JSON array
+            return json.loads(b'[' + b','.join(lines) + b']')
+        except ValueError:
+            return [decode_json(line) for line in lines]
+
+    def close(self):
+        """Return the object on a last line that has no newline"""
+        line, self.remainder = self.remainder, b""
+        return [decode_json(line)] if line.strip() else []
+
+
+class SSEParser:
+    """Split a byte stream into server-sent events, returned as (event type, data) pairs"""
+
+    def __init__(self):
+        self.remainder = b""  # Partial last line
+        self.event = ""  # Type set by an "event:" field
+        self.data = []  # "data:" lines of the event being read
+
+    def feed(self, chunk):
+        """Return the events completed by a chunk of bytes"""
+        if self.remainder:
+            chunk = self.remainder + chunk
+        held = b""
+        if b'\r' in chunk:
+            # Lines may also end in \r\n or \r; a trailing \r may be the first half of \r\n
+            if chunk.endswith(b'\r'):
+                chunk, held = chunk[:-1], b'\r'
+            chunk = chunk.replace(b'\r\n', b'\n').replace(b'\r', b'\n')
+        lines = chunk.split(b'\n')
+        self.remainder = lines.pop() + held
+        events = []
+        for line in lines:
+            self.read_line(line, events)
+        return events
+
+    def close(self):
+        """Return an event left unfinished when the stream ended"""
+        events = []
+        line, self.remainder = self.remainder.rstrip(b'\r'), b""
+        if line:
+            self.read_line(line, events)
+        self.read_line(b"", events)
+        return events
+
+    def read_line(self, line, events):
+        if not line:
+            # A blank line ends the event
+            if self.data:
+                events.append((self.event or 'message', b'\n'.join(self.data).decode('utf-8')))
+            self.event = ""
+            self.data = []
+            return
+        if line[0] == 0x3A:  # ":" starts a comment, sent as a keep-alive
+            return
+        field, _, value = line.partition(b':')
+        if value[:1] == b' ':
+            value = value[1:]
+        if field == b'data':
+            self.data.append(value)
+        elif field == b'event':
+            self.event = value.decode('utf-8')
+        # "id" and "retry" are not needed for a single completion
+
+
+def ollama_stats(response):
+    """Timing statistics from Ollama's final object; durations are reported in nanoseconds"""
+    stats = {}
+    for key, name in (('prompt_eval_count', 'prompt_tokens'), ('eval_count', 'tokens')):
+        if key in response:
+            stats[name] = response[key]
+    for key, name in (('total_duration', 'total_seconds'), ('load_duration', 'load_seconds'),
+                      ('prompt_eval_duration', 'prompt_seconds'), ('eval_duration', 'seconds')):
+        if key in response:
+            stats[name] = response[key] / 1e9
+    if stats.get('tokens') and stats.get('seconds'):
+        stats['tokens_per_second'] = stats['tokens'] / stats['seconds']
+    return stats
+
+
+def openai_stats(response):
+    """Token counts from the usage of an OpenAI-style final chunk"""
+    usage = response.get('usage') or {}
+    stats = {}
+    for key, name in (('prompt_tokens', 'prompt_tokens'), ('completion_tokens', 'tokens')):
+        if key in usage:
+            stats[name] = usage[key]
+    return stats
+
+
+def format_stats(stats):
+    """Short summary of statistics, such as: 120 tokens, 35.2 tokens/s"""
+    parts = []
+    if 'prompt_tokens' in stats:
+        parts.append(f"{stats['prompt_tokens']:,} prompt tokens")
+    if 'tokens' in stats:
+        parts.append(f"{stats['tokens']:,} tokens")
+    if 'tokens_per_second' in stats:
+        parts.append(f"{stats['tokens_per_second']:.1f} tokens/s")
+    if 'first_token_seconds' in stats:
+        parts.append(f"first token after {stats['first_token_seconds']:.1f} s")
+    return ", ".join(parts)
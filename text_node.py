@@ -1,12 +1,23 @@
 from PySide6.QtWidgets import *
 from PySide6.QtCore import *
 from PySide6.QtGui import *
+import uuid
 
 class TextNode(QGraphicsItem):
     text_changed = Signal(str)  # Signal for text changes
 
+    # Only about this many times what fits in the box is laid out; longer texts end in an ellipsis
+    preview_overflow_ratio = 2
+    # View scales below which the node is drawn as a coloured block with its title,
+    # and below that as a plain coloured rectangle
+    lod_title_scale = 0.4
+    lod_block_scale = 0.15
+
     def __init__(self, title, text):
         super().__init__()
+        self.node_id = uuid.uuid4().hex  # Stable key in the canvas node registry
+        self._text_layout = None  # Cached word-wrapped layout of the node text
+        self._text_layout_key = None
         self.title = title
         self.text = text
         self.width = 250
@@ -43,9 +54,33 @@ class TextNode(QGraphicsItem):
         }
         self.current_color = 'Yellow'
         self.sticky_color = self.color_map['Yellow']
+
+    @property
+    def text(self):
+        return self._text
+
+    @text.setter
+    def text(self, value):
+        self._text = value
+        self._text_layout = None  # Re-wrap on next paint
         
     def boundingRect(self):
+        # Include the sockets and selection border that are painted past the body,
+        # so partial viewport updates repaint everything this node draws
+        margin = self.socket_radius + 2
+        return self.body_rect().adjusted(-margin, -margin, margin, margin)
+
+    def body_rect(self):
+        """Get the rectangle of the sticky note itself"""
         return QRectF(0, 0, self.width, self.height)
+
+    def shape(self):
+        path = QPainterPath()
+        path.setFillRule(Qt.WindingFill)  # Sockets overlap the body edge
+        path.addRect(self.body_rect())
+        path.addEllipse(self.get_input_socket_rect())
+        path.addEllipse(self.get_output_socket_rect())
+        return path
         
     def getHandleRect(self):
         """Get the rectangle for the bottom-right resize handle"""
@@ -75,6 +110,11 @@ class TextNode(QGraphicsItem):
                      self.socket_radius * 2)
         
     def paint(self, painter, option, widget):
+        lod = option.levelOfDetailFromTransform(painter.worldTransform())
+        if lod < self.lod_title_scale:
+            self.paint_overview(painter, lod)
+            return
+
         # Draw background and border
         if self.isSelected():
             painter.setPen(QPen(QColor(0, 120, 215), 4))  # Keep blue border for selection
@@ -83,7 +123,7 @@ class TextNode(QGraphicsItem):
         
         # Always use sticky_color for background, regardless of editing state
         painter.setBrush(self.sticky_color)
-        painter.drawRect(self.boundingRect())
+        painter.drawRect(self.body_rect())
         
         painter.setPen(Qt.black)
         
@@ -93,9 +133,13 @@ class TextNode(QGraphicsItem):
             painter.drawText(number_rect, Qt.AlignRight, f"#{self.order_number}")
         
         if not self.editing:  # Only paint text if not editing
-            # Draw full text content, starting below the number area
-            content_rect = QRectF(5, 25, self.width-10, self.height-30)
-            painter.drawText(content_rect, Qt.AlignLeft | Qt.TextWordWrap, self.text)
+            # Draw the cached text layout, starting below the number area
+            content_rect = self.get_content_rect()
+            layout = self.get_text_layout(painter.font())
+            painter.save()
+            painter.setClipRect(content_rect, Qt.IntersectClip)
+            layout.draw(painter, content_rect.topLeft())
+            painter.restore()
         
         # Draw resize handle when selected
         if self.isSelected():
@@ -128,12 +172,98 @@ class TextNode(QGraphicsItem):
                                  self.socket_radius * 2,
                                  self.socket_radius * 2))
         
+    def paint_overview(self, painter, lod):
+        """Cheap drawing for zoomed-out views: a coloured block, titled if still legible"""
+        painter.setRenderHint(QPainter.Antialiasing, False)
+        if self.isSelected():
+            pen = QPen(QColor(0, 120, 215), 2)
+            pen.setCosmetic(True)  # Keep the border visible at any zoom
+            painter.setPen(pen)
+        else:
+            painter.setPen(Qt.NoPen)
+        painter.setBrush(self.sticky_color)
+        painter.drawRect(self.body_rect())
+
+        if lod >= self.lod_block_scale and self.title:
+            # Scale the title font up so it stays readable on screen
+            font = QFont(painter.font())
+            if font.pointSizeF() > 0:
+                font.setPointSizeF(font.pointSizeF() / lod)
+            else:
+                font.setPixelSize(int(font.pixelSize() / lod))
+            painter.setFont(font)
+            painter.setPen(Qt.black)
+            painter.drawText(self.body_rect().adjusted(5, 5, -5, -5),
+                             Qt.AlignCenter | Qt.TextWordWrap, self.title)
+
+    def get_content_rect(self):
+        """Get the rectangle the node text is drawn in"""
+        return QRectF(5, 25, self.width-10, self.height-30)
+
+    def get_text_layout(self, font):
+        """Return the word-wrapped text layout, rebuilding it only when text, size or font change"""
+        key = (self.width, self.height, font)
+        if self._text_layout is not None and self._text_layout_key == key:
+            return self._text_layout
+
+        content_rect = self.get_content_rect()
+        metrics = QFontMetricsF(font)
+        text = self.text
+        # Only lay out roughly what can be shown in the box
+        columns = int(content_rect.width() / max(metrics.averageCharWidth(), 1)) + 1
+        rows = int(content_rect.height() / max(metrics.lineSpacing(), 1)) + 1
+        text = text[:columns * rows * self.preview_overflow_ratio]
+
+        layout, last_start = self.layout_lines(text, font, content_rect)
+        if last_start is None and len(text) < len(self.text) and layout.lineCount():
+            last_start = layout.lineAt(layout.lineCount() - 1).textStart()
+        if last_start is not None:
+            # The text goes on past the box: end the last line that fits with an ellipsis
+            rest = self.text[last_start:last_start + columns * 2].replace('\n', ' ')
+            elided = metrics.elidedText(rest + "\u2026", Qt.ElideRight, content_rect.width())
+            layout, _ = self.layout_lines(text[:last_start] + elided, font, content_rect)
+
+        self._text_layout = layout
+        self._text_layout_key = (self.width, self.height, QFont(font))
+        return layout
+
+    @staticmethod
+    def layout_lines(text, font, rect):
+        """Word-wrap text into the lines that fit entirely in rect.
+
+        Returns the layout and, if some of the text didn't fit, where the
+        last line that did starts in the text.
+        """
+        layout = QTextLayout(text, font)
+        option = QTextOption(Qt.AlignLeft)
+        option.setWrapMode(QTextOption.WordWrap)
+        layout.setTextOption(option)
+        layout.beginLayout()
+        y = 0.0
+        last_start = None
+        while True:
+            line = layout.createLine()
+            if not line.isValid():
+                break
+            line.setLineWidth(rect.width())
+            if y + line.height() > rect.height():
+                # This line doesn't fit; stop and make the one before it the last
+                last_start = layout.lineAt(layout.lineCount() - 2).textStart() if layout.lineCount() > 1 else 0
+                line.setNumColumns(0)
+                line.setPosition(QPointF(0, rect.height()))
+                break
+            line.setPosition(QPointF(0, y))
+            y += line.height()
+        layout.endLayout()
+        return layout, last_start
+
     def hoverMoveEvent(self, event):
         if self.isSelected():
             if self.getHandleRect().contains(event.pos()):
                 self.setCursor(Qt.SizeFDiagCursor)
                 return
         # Check if hovering over sockets
+        previous_socket = self.hovered_socket
         if self.get_input_socket_rect().contains(event.pos()):
             self.hovered_socket = 'input'
             self.setCursor(Qt.CrossCursor)
@@ -143,7 +273,9 @@ class TextNode(QGraphicsItem):
         else:
             self.hovered_socket = None
             self.setCursor(Qt.ArrowCursor)
-        self.update()
+        # Only repaint when the highlighted socket actually changes
+        if self.hovered_socket != previous_socket:
+            self.update()
         super().hoverMoveEvent(event)
 
     def mousePressEvent(self, event):
@@ -155,12 +287,12 @@ class TextNode(QGraphicsItem):
     def mouseMoveEvent(self, event):
         if self.resizing:
             pos = event.pos()
+            # Announce the geometry change first so the old area is repainted too
+            self.prepareGeometryChange()
             self.width = max(100, pos.x())
             self.height = max(100, pos.y())
-            self.prepareGeometryChange()
-            self.update()
-            if self.scene():
-                self.scene().update()
+            self.update_connections()
+            self.notify_changed('resize')
         else:
             super().mouseMoveEvent(event)
 
@@ -171,12 +303,26 @@ class TextNode(QGraphicsItem):
             super().mouseReleaseEvent(event)
         
     def itemChange(self, change, value):
-        if change == QGraphicsItem.ItemPositionChange:
-            # Notify scene of position change for connection updates
-            if self.scene():
-                self.scene().update()
+        if change == QGraphicsItem.ItemPositionHasChanged:
+            # Re-route only the connections attached to this node
+            self.update_connections()
+            self.notify_changed('move')
         return super().itemChange(change, value)
 
+    def update_connections(self):
+        """Ask the canvas to update the connections incident to this node"""
+        if self.scene() and self.scene().views():
+            view = self.scene().views()[0]
+            if hasattr(view, 'update_node_connections'):
+                view.update_node_connections(self)
+
+    def notify_changed(self, change):
+        """Tell the canvas this node had a 'move', 'resize', 'text' or 'color' change"""
+        if self.scene() and self.scene().views():
+            view = self.scene().views()[0]
+            if hasattr(view, 'node_changed'):
+                view.node_changed(self, change)
+
     def mouseDoubleClickEvent(self, event):
         if not self.editing:
             self.startEditing()
@@ -184,7 +330,11 @@ class TextNode(QGraphicsItem):
         
     def handleTextEdit(self):
         if self.editing and self.text_editor:
-            self.text = self.text_editor.toPlainText()
+            text = self.text_editor.toPlainText()
+            if text == self.text:
+                return
+            self.text = text
+            self.notify_changed('text')
             # Update the node visual
             self.update()
             # Update TextViewer
@@ -212,7 +362,7 @@ class TextNode(QGraphicsItem):
             """)
         
         # Position editor over node
-        scene_rect = self.sceneBoundingRect()
+        scene_rect = self.mapRectToScene(self.body_rect())
         view = self.scene().views()[0]
         view_pos = view.mapFromScene(scene_rect.topLeft())
         global_pos = view.viewport().mapToGlobal(view_pos)
@@ -258,6 +408,7 @@ class TextNode(QGraphicsItem):
         if color_name in self.color_map:
             self.current_color = color_name
             self.sticky_color = self.color_map[color_name]
+            self.notify_changed('color')
             
             # Update text editor background if it exists
             if self.text_editor:
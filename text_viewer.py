@@ -1,36 +1,116 @@
 from PySide6.QtWidgets import *
 from PySide6.QtCore import *
+from PySide6.QtGui import QTextCursor
+
+# Texts longer than this are loaded a chunk at a time so the window stays responsive
+LARGE_TEXT_SIZE = 100000
+LOAD_CHUNK_SIZE = 100000
+# Milliseconds without typing before edits are written back to the node
+WRITE_BACK_DELAY = 300
+TITLE_LENGTH = 30
 
 class TextViewer(QWidget):
     def __init__(self):
         super().__init__()
         layout = QVBoxLayout(self)
         layout.setContentsMargins(0, 0, 0, 0)  # Remove margins for perfect alignment
-        
-        self.text_edit = QTextEdit()
+
+        # Plain text only: node text is never interpreted as HTML, and the
+        # editor lays out paragraphs as they are shown rather than all at once
+        self.text_edit = QPlainTextEdit()
         self.text_edit.setReadOnly(False)
         self.text_edit.textChanged.connect(self.text_changed)
         layout.addWidget(self.text_edit)
-        
+
         self.current_node = None
-        
+        self.shown_text = None  # Node text the editor holds, as of the last load or write-back
+        self.loading = False
+        self.pending_chunks = []  # Rest of a large text still to be loaded
+
+        self.load_timer = QTimer(self)
+        self.load_timer.setInterval(0)
+        self.load_timer.timeout.connect(self.load_next_chunk)
+
+        # Edits are written to the node once typing pauses
+        self.write_timer = QTimer(self)
+        self.write_timer.setSingleShot(True)
+        self.write_timer.setInterval(WRITE_BACK_DELAY)
+        self.write_timer.timeout.connect(self.write_back)
+
     def display_node(self, node):
+        # Write edits to the node they were made in before showing another one
+        self.flush()
+        if node is self.current_node and node.text == self.shown_text and not self.loading:
+            return  # Already shown; setting it again would lay out the whole text anew
         self.current_node = node
         # Clear default text when displaying in text viewer
         if node.text == "Enter text here...":
             node.text = ""
-            self.text_edit.setText("")
-        else:
-            self.text_edit.setText(node.text)
-        
+        self.load_text(node.text)
+
+    def load_text(self, text):
+        """Show text, loading a large one in chunks between events"""
+        self.cancel_load()
+        self.write_timer.stop()
+        self.shown_text = text
+        if len(text) <= LARGE_TEXT_SIZE:
+            self.set_text(text)
+            return
+        self.loading = True
+        # Read-only until the whole text is there, so edits can't land in the middle of loading
+        self.text_edit.setReadOnly(True)
+        self.text_edit.setUndoRedoEnabled(False)
+        self.pending_chunks = [text[i:i + LOAD_CHUNK_SIZE] for i in range(LOAD_CHUNK_SIZE, len(text), LOAD_CHUNK_SIZE)]
+        self.pending_chunks.reverse()
+        self.set_text(text[:LOAD_CHUNK_SIZE])
+        self.load_timer.start()
+
+    def set_text(self, text):
+        # Loading isn't an edit, so it mustn't start a write-back
+        self.text_edit.blockSignals(True)
+        self.text_edit.setPlainText(text)
+        self.text_edit.blockSignals(False)
+
+    def load_next_chunk(self):
+        cursor = QTextCursor(self.text_edit.document())
+        cursor.movePosition(QTextCursor.End)
+        self.text_edit.blockSignals(True)
+        cursor.insertText(self.pending_chunks.pop())
+        self.text_edit.blockSignals(False)
+        if not self.pending_chunks:
+            self.cancel_load()
+
+    def cancel_load(self):
+        """Stop loading chunks and make the editor editable again"""
+        self.load_timer.stop()
+        self.pending_chunks = []
+        self.text_edit.setUndoRedoEnabled(True)
+        self.text_edit.setReadOnly(False)
+        self.loading = False
+
     def text_changed(self):
-        if self.current_node:
-            text = self.text_edit.toPlainText()
-            self.current_node.text = text
-            
-            # Update title from first line
-            first_line = text.split('\n')[0][:30]  # Limit title length
-            self.current_node.title = first_line
-            
-            # Force node to redraw
-            self.current_node.update()
+        if self.current_node and not self.loading:
+            self.write_timer.start()
+
+    def flush(self):
+        """Write pending edits to the node now"""
+        if self.write_timer.isActive():
+            self.write_timer.stop()
+            self.write_back()
+
+    def write_back(self):
+        if not self.current_node:
+            return
+        text = self.text_edit.toPlainText()
+        if text == self.shown_text:
+            return  # Typed and undone, or nothing to write
+        self.shown_text = text
+        self.current_node.text = text
+
+        # Update title from first line, without splitting the whole text
+        first_line = self.text_edit.document().firstBlock().text()[:TITLE_LENGTH]
+        self.current_node.title = first_line
+        self.current_node.notify_changed('text')
+
+        # Force node to redraw
+        self.current_node.update()